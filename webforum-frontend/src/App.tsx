@@ -4,7 +4,7 @@ import Login from './Login';
 import PostCard from './PostCard';
 import CreatePost from './CreatePost';
 import api from './api';
-import type { Post, User } from './types';
+import type { Page, Post, User } from './types';
 import { Search, X } from 'lucide-react';
 
 const CATEGORIES = ["All", "ConnectOS", "Hardware", "News", "Q&A"];
@@ -19,6 +19,9 @@ function App() {
   });
   
   const [loading, setLoading] = useState(true);
+  // Cursor link for the next feed page; null when on the last page or searching.
+  const [nextPage, setNextPage] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showCreate, setShowCreate] = useState(false);
   const [selectedCategory, setSelectedCategory] = useState("All");
   
@@ -27,6 +30,37 @@ function App() {
   const [isSearching, setIsSearching] = useState(false);
   const debounceTimer = useRef<NodeJS.Timeout | null>(null);
 
+  // Only the unfiltered feed takes in new posts from the live stream.
+  const isLiveFeed = useRef(true);
+  isLiveFeed.current = selectedCategory === "All" && searchQuery.trim().length === 0;
+
+  // Live updates over Server-Sent Events replace polling the feed.
+  useEffect(() => {
+    if (!token) return;
+    const source = new EventSource(`${api.defaults.baseURL}/events/`);
+    const patchPost = (id: number, changes: Partial<Post>) =>
+      setPosts(prev => prev.map(p => p.id === id ? { ...p, ...changes } : p));
+
+    source.addEventListener('post_created', (e) => {
+      const post = JSON.parse((e as MessageEvent).data);
+      if (post.truncated || !isLiveFeed.current) return;
+      setPosts(prev => prev.some(p => p.id === post.id) ? prev : [post, ...prev]);
+    });
+    source.addEventListener('post_categorised', (e) => {
+      const { id, category } = JSON.parse((e as MessageEvent).data);
+      patchPost(id, { category });
+    });
+    source.addEventListener('like_count', (e) => {
+      const { id, like_count } = JSON.parse((e as MessageEvent).data);
+      patchPost(id, { like_count });
+    });
+    source.addEventListener('flagged', (e) => {
+      const { id, is_misleading } = JSON.parse((e as MessageEvent).data);
+      patchPost(id, { is_misleading });
+    });
+    return () => source.close();
+  }, [token]);
+
   useEffect(() => {
     if (token) {
       if (searchQuery.trim().length > 2) {
@@ -42,8 +76,9 @@ function App() {
     try {
       setLoading(true);
       const url = selectedCategory === "All" ? '/posts/' : `/posts/?category=${encodeURIComponent(selectedCategory)}`;
-      const postsRes = await api.get(url);
-      setPosts(postsRes.data);
+      const postsRes = await api.get<Page<Post>>(url);
+      setPosts(postsRes.data.results);
+      setNextPage(postsRes.data.next);
     } catch (err) {
       console.error('Failed to fetch data');
     } finally {
@@ -52,11 +87,30 @@ function App() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextPage || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await api.get<Page<Post>>(nextPage);
+      // Posts that arrived over the live stream may already be in the list.
+      setPosts(prev => {
+        const seen = new Set(prev.map(p => p.id));
+        return [...prev, ...response.data.results.filter(p => !seen.has(p.id))];
+      });
+      setNextPage(response.data.next);
+    } catch (err) {
+      console.error('Failed to load more posts');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDebouncedSearch = () => {
     if (debounceTimer.current) clearTimeout(debounceTimer.current);
     setIsSearching(true);
     setLoading(true);
     setPosts([]);
+    setNextPage(null);
 
     debounceTimer.current = setTimeout(async () => {
       try {
@@ -71,26 +125,9 @@ function App() {
   };
 
   const handlePostCreated = (newPost: Post) => {
-    // Immediately add the raw post to the UI
-    setPosts([newPost, ...posts]);
+    // The category arrives later as a post_categorised event.
+    setPosts(prev => prev.some(p => p.id === newPost.id) ? prev : [newPost, ...prev]);
     setShowCreate(false);
-
-    // Wait 5 seconds for the AI thread to finish
-    setTimeout(async () => {
-      try {
-        const response = await api.get(`/posts/${newPost.id}/`);
-        const updatedPost = response.data;
-        
-        // Update the posts list with the fresh data from the server
-        setPosts(prevPosts => {
-          const newPosts = prevPosts.map(p => p.id === updatedPost.id ? updatedPost : p);
-          return [...newPosts]; // Ensure new array reference
-        });
-        console.log(`Background sync complete for post ${newPost.id}`);
-      } catch (err) {
-        console.error("Failed to sync new post data", err);
-      }
-    }, 5000);
   };
 
   const logout = () => {
@@ -98,6 +135,7 @@ function App() {
     localStorage.removeItem('user');
     setToken(null);
     setPosts([]);
+    setNextPage(null);
     setUser(null);
   };
 
@@ -206,6 +244,13 @@ function App() {
                 {searchQuery ? 'No semantically related posts found.' : 'No active discussions found in this category.'}
               </div>
             )}
+            {nextPage && (
+              <div style={{ textAlign: 'center', marginBottom: '2rem' }}>
+                <button onClick={loadMore} disabled={loadingMore} style={{ background: 'transparent', border: '1px solid #333', fontSize: '0.85rem' }}>
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </main>
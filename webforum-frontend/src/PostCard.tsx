@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import type { Post, Comment, User } from './types';
+import type { Page, Post, Comment, User } from './types';
 import api from './api';
 import { MessageSquare, ThumbsUp, AlertTriangle, Send } from 'lucide-react';
 
@@ -11,6 +11,9 @@ interface PostCardProps {
 const PostCard: React.FC<PostCardProps> = ({ post, currentUser }) => {
   const [showComments, setShowComments] = useState(false);
   const [comments, setComments] = useState<Comment[]>([]);
+  // Cursor link for the next page of replies; null once the thread is fully loaded.
+  const [commentsNext, setCommentsNext] = useState<string | null>(null);
+  const [loadingMoreComments, setLoadingMoreComments] = useState(false);
   const [localPost, setLocalPost] = useState<Post>(post);
   const [newComment, setNewComment] = useState('');
   const [isSubmittingComment, setIsSubmittingComment] = useState(false);
@@ -30,13 +33,33 @@ const PostCard: React.FC<PostCardProps> = ({ post, currentUser }) => {
 
   const fetchComments = async () => {
     try {
-      const response = await api.get(`/comments/?post=${post.id}`);
-      setComments(response.data);
+      const response = await api.get<Page<Comment>>(`/comments/?post=${post.id}&page_size=100`);
+      setComments(response.data.results);
+      setCommentsNext(response.data.next);
     } catch (err) {
       console.error('Failed to load comments');
     }
   };
 
+  const loadMoreComments = async () => {
+    if (!commentsNext || loadingMoreComments) return;
+    setLoadingMoreComments(true);
+    try {
+      const response = await api.get<Page<Comment>>(commentsNext);
+      // Replies posted from this card are already shown; keep the thread oldest first.
+      setComments(prev => {
+        const seen = new Set(prev.map(c => c.id));
+        return [...prev, ...response.data.results.filter(c => !seen.has(c.id))]
+          .sort((a, b) => a.created_at.localeCompare(b.created_at) || a.id - b.id);
+      });
+      setCommentsNext(response.data.next);
+    } catch (err) {
+      console.error('Failed to load more comments');
+    } finally {
+      setLoadingMoreComments(false);
+    }
+  };
+
   const handleAddComment = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!newComment.trim() || isSubmittingComment) return;
@@ -66,9 +89,8 @@ const PostCard: React.FC<PostCardProps> = ({ post, currentUser }) => {
 
   const handleLike = async () => {
     try {
-      await api.post(`/posts/${localPost.id}/like/`);
-      const response = await api.get(`/posts/${localPost.id}/`);
-      setLocalPost(response.data);
+      const response = await api.post(`/posts/${localPost.id}/like/`);
+      setLocalPost({ ...localPost, like_count: response.data.like_count });
     } catch (err: any) {
       alert(err.response?.data?.error || 'Failed to like post');
     }
@@ -187,6 +209,11 @@ const PostCard: React.FC<PostCardProps> = ({ post, currentUser }) => {
           ) : (
             <div style={{ fontSize: '0.8rem', color: '#555' }}>No replies yet.</div>
           )}
+          {commentsNext && (
+            <button onClick={loadMoreComments} disabled={loadingMoreComments} style={{ background: 'transparent', border: '1px solid #333', fontSize: '0.75rem', padding: '4px 10px' }}>
+              {loadingMoreComments ? 'Loading...' : 'Load more replies'}
+            </button>
+          )}
         </div>
       )}
     </div>
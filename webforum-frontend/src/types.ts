@@ -21,4 +21,11 @@ export interface Post {
   is_misleading: boolean;
   like_count: number;
   comment_count: number;
+  category: string | null;
+}
+
+export interface Page<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
 }
@@ -1,6 +1,7 @@
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Post, Comment, Like
+from .models import User, Post, Comment, Like, EmbeddingJob
 
 class CustomUserAdmin(UserAdmin):
     """
@@ -21,6 +22,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('is_misleading', 'created_at')
     search_fields = ('content', 'author__username')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Matches content through the GIN full-text index instead of an ILIKE scan.
+        """
+        if not search_term:
+            return queryset, False
+        query = SearchQuery(search_term, config='english', search_type='websearch')
+        matches = queryset.filter(search_vector=query) | queryset.filter(author__username__iexact=search_term)
+        return matches, False
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'post', 'created_at')
@@ -29,5 +40,10 @@ class CommentAdmin(admin.ModelAdmin):
 class LikeAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'post', 'created_at')
 
+@admin.register(EmbeddingJob)
+class EmbeddingJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'post', 'attempts', 'available_at', 'last_error')
+    list_filter = ('attempts',)
+
 # Register our Custom User model
 admin.site.register(User, CustomUserAdmin)
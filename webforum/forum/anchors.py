@@ -0,0 +1,204 @@
+"""
+Category anchors used to classify posts.
+
+Anchor vectors are precomputed by `python manage.py refresh_anchors` and stored as
+a versioned .npz file named after a hash of the descriptions and embedding model,
+so each embedding provider gets its own file.
+Each process loads the file once in ForumConfig.ready(). Changing
+ANCHOR_DESCRIPTIONS changes the hash, so stale files are ignored and the command
+knows it has work to do.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .embeddings import get_provider
+
+# 1. Refined Anchor Descriptions for clear differentiation
+ANCHOR_DESCRIPTIONS = {
+    "Q&A": "Questions from users seeking help, troubleshooting tips, or technical support. Contains phrases like 'How do I', 'Help needed', or 'Problem with'.",
+    "News": "Official announcements, press releases, company updates, and news regarding new Barrows store openings or product launches.",
+    "ConnectOS": "Deep technical discussions about software engineering, API integration, cloud latency, WebSocket stability, and backend architecture.",
+    "Hardware": "Physical device installation, heat dissipation issues, LED hardware, SPIRITS units, and mechanical mounting on retail shelves."
+}
+
+# Anchor vectors per embedding model: {model: {name: vector}}.
+ANCHOR_CACHE = {}
+_anchor_lock = threading.Lock()
+
+
+def description_hash(description, model):
+    return hashlib.sha256(f"{model}\n{description}".encode()).hexdigest()
+
+
+def anchors_hash(model, descriptions=None):
+    """
+    Version of the whole anchor set: changes when any name, description or the model changes.
+    """
+    descriptions = ANCHOR_DESCRIPTIONS if descriptions is None else descriptions
+    payload = json.dumps({'model': model, 'anchors': descriptions}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def anchors_path(model):
+    return settings.ANCHOR_VECTORS_DIR / f"anchors-{anchors_hash(model)[:16]}.npz"
+
+
+def load_anchors(model, path=None):
+    """
+    Reads anchors for the current descriptions from disk.
+    Returns None if they have not been precomputed yet.
+    """
+    path = path or anchors_path(model)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data['hash']) != anchors_hash(model):
+            return None
+        return dict(zip(data['names'].tolist(), data['vectors']))
+
+
+def save_anchors(anchors, model, path=None):
+    """
+    Writes anchors atomically, so a reader never sees a half-written file.
+    """
+    path = path or anchors_path(model)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    names = list(anchors)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            hash=anchors_hash(model),
+            names=np.array(names),
+            description_hashes=np.array([description_hash(ANCHOR_DESCRIPTIONS[name], model) for name in names]),
+            vectors=np.stack([anchors[name] for name in names]).astype(np.float32),
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def compute_anchors(provider, previous=None):
+    """
+    Embeds the anchor descriptions in one request. Vectors in `previous`
+    (keyed by description hash) are reused rather than re-embedded.
+    """
+    previous = previous or {}
+    anchors = {}
+    missing = []
+    for name, desc in ANCHOR_DESCRIPTIONS.items():
+        digest = description_hash(desc, provider.model)
+        if digest in previous:
+            anchors[name] = previous[digest]
+        else:
+            missing.append(name)
+    if missing:
+        vectors = provider.embed([ANCHOR_DESCRIPTIONS[name] for name in missing])
+        anchors.update(zip(missing, vectors))
+    return {name: np.asarray(anchors[name], dtype=np.float32) for name in ANCHOR_DESCRIPTIONS}
+
+
+def load_previous_vectors():
+    """
+    Collects vectors from every anchor file on disk, keyed by description hash,
+    so a refresh only re-embeds descriptions that actually changed.
+    """
+    previous = {}
+    directory = settings.ANCHOR_VECTORS_DIR
+    if not os.path.isdir(directory):
+        return previous
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('anchors-') and filename.endswith('.npz')):
+            continue
+        with np.load(directory / filename) as data:
+            if 'description_hashes' in data:
+                previous.update(zip(data['description_hashes'].tolist(), data['vectors']))
+    return previous
+
+
+def preload():
+    """
+    Loads the configured provider's anchors from disk. Called once per process
+    from ForumConfig.ready().
+    """
+    model = get_provider().model
+    anchors = load_anchors(model)
+    if anchors:
+        with _anchor_lock:
+            ANCHOR_CACHE[model] = anchors
+
+
+def get_anchor_vectors(provider=None):
+    """
+    Returns the anchor vectors for the provider's model, normally loaded at startup.
+    If they were never precomputed, embeds them once (under a lock, so concurrent
+    workers do not race) and keeps them in memory only.
+    """
+    provider = provider or get_provider()
+    anchors = ANCHOR_CACHE.get(provider.model)
+    if anchors:
+        return anchors
+    with _anchor_lock:
+        if not ANCHOR_CACHE.get(provider.model):
+            anchors = load_anchors(provider.model)
+            if anchors is None:
+                print("Initialising Barrows Semantic Anchors... (run `manage.py refresh_anchors` to precompute)")
+                anchors = compute_anchors(provider)
+            ANCHOR_CACHE[provider.model] = anchors
+    return ANCHOR_CACHE[provider.model]
+
+
+class Categoriser:
+    """
+    Nearest-anchor classifier over a stacked (n_anchors x dims) float32 matrix.
+    A whole batch of post vectors is scored with one matrix product instead of a
+    Python loop per anchor per post.
+
+    metric='l2' reproduces the original KNN rule. metric='cosine' compares directions only.
+    """
+    METRICS = ('l2', 'cosine')
+
+    def __init__(self, anchors, metric='l2'):
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; expected one of {self.METRICS}")
+        self.metric = metric
+        self.names = list(anchors)
+        matrix = np.stack([np.asarray(anchors[name], dtype=np.float32) for name in self.names])
+        if metric == 'cosine':
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.squared_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def distances(self, vectors):
+        """
+        Returns an (n_posts x n_anchors) matrix of distances.
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        products = vectors @ self.matrix.T
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            return 1.0 - products / np.where(norms == 0, 1, norms)
+        # ||x - a||^2 = ||x||^2 - 2 x.a + ||a||^2, clamped against rounding below zero.
+        squared = np.einsum('ij,ij->i', vectors, vectors)[:, None] - 2 * products + self.squared_norms
+        return np.sqrt(np.maximum(squared, 0))
+
+    def classify(self, vectors):
+        """
+        Returns (categories, margins) for a batch of vectors. The margin is the gap
+        between the nearest and second-nearest anchor; small margins mean the post
+        sits between categories.
+        """
+        distances = self.distances(vectors)
+        if len(self.names) == 1:
+            return [self.names[0]] * len(distances), np.full(len(distances), np.inf, dtype=np.float32)
+        nearest = np.partition(distances, 1, axis=1)
+        best = np.argmin(distances, axis=1)
+        return [self.names[i] for i in best], nearest[:, 1] - nearest[:, 0]
+
+
+def get_categoriser(provider=None, metric=None):
+    return Categoriser(get_anchor_vectors(provider), metric=metric or settings.CATEGORY_METRIC)
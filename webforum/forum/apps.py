@@ -8,6 +8,11 @@ class ForumConfig(AppConfig):
         """
         The ready() method is called when Django starts.
         We import our signals here so the 'post_save' listeners 
-        are active and ready to catch new posts.
+        are active and ready to catch new posts, and load the
+        precomputed category anchors once per process.
+        forum.metrics is imported so new DB connections get its query recorder.
         """
         import forum.signals
+        import forum.metrics
+        from forum import anchors
+        anchors.preload()
@@ -0,0 +1,62 @@
+"""
+Token authentication with a read-through cache.
+
+DRF's TokenAuthentication joins authtoken_token to the user table on every request.
+CachedTokenAuthentication keeps the (user, token) pair in the AUTH_TOKEN_CACHE_ALIAS
+cache for AUTH_TOKEN_CACHE_TTL seconds. Saving or deleting a token or a user drops
+the matching entry (see forum.signals), so rotated tokens and changed moderator
+status take effect on the next request rather than after the TTL, provided every
+process reads the same cache. With a per-process cache the eviction reaches only the
+process that made the change, which is why the cache is off unless a shared alias
+is configured.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics
+
+
+def _cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def cache_key(token_key):
+    # Hashed, so raw tokens never show up in a shared cache's key space.
+    return f"auth-token:{hashlib.sha256(token_key.encode()).hexdigest()}"
+
+
+def forget_tokens(token_keys):
+    """
+    Drops cached credentials now and again after commit, so a concurrent request
+    cannot re-cache the old row between the write and the commit.
+    """
+    keys = [cache_key(token_key) for token_key in token_keys]
+    if not keys:
+        return
+    _cache().delete_many(keys)
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_TTL:
+            return super().authenticate_credentials(key)
+
+        cache = _cache()
+        cached = cache.get(cache_key(key))
+        if cached is not None:
+            metrics.AUTH_TOKEN_CACHE.inc(result='hit')
+            user, token = cached
+            if not user.is_active:
+                raise AuthenticationFailed('User inactive or deleted.')
+            return user, token
+
+        metrics.AUTH_TOKEN_CACHE.inc(result='miss')
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key(key), (user, token), settings.AUTH_TOKEN_CACHE_TTL)
+        return user, token
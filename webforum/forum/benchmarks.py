@@ -0,0 +1,222 @@
+"""
+Latency and query-count benchmarks for the API hot paths.
+
+seed() fills the database with synthetic users, posts, comments and likes whose
+text is recombined from the posts in dummy_data.json. run() then times each
+endpoint through the Django test client and counts the SQL it issues. Embeddings
+come from the offline HashingProvider, so results do not depend on the network.
+
+Use it through `python manage.py benchmark_api`, which runs against a throwaway
+database and writes the results as JSON.
+"""
+import json
+import random
+import subprocess
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import feed_cache, ranking
+from .anchors import get_categoriser
+from .embeddings import get_provider, get_query_cache
+from .models import Comment, Like, Post, User
+from .search import reduce_embedding
+
+FIXTURE_PATH = settings.BASE_DIR.parent / 'dummy_data.json'
+COMMENT_TEXTS = [
+    "Seeing the same thing here.",
+    "Which firmware version are you on?",
+    "Thanks, that fixed it for us.",
+    "Can you share the store id?",
+    "We rolled this out last week without issues.",
+]
+
+
+def fixture_sentences():
+    with open(FIXTURE_PATH) as f:
+        rows = json.load(f)
+    return [row['fields']['content'] for row in rows if row['model'] == 'forum.post']
+
+
+def seed(users=20, posts=1000, comments_per_post=3, likes_per_post=3, seed=0, batch_size=500):
+    """
+    Bulk-inserts a synthetic forum and returns the created posts' ids.
+    Post bodies join two fixture sentences and a store number, so full-text and
+    semantic search both have realistic overlap to work with. Posts are spaced a
+    minute apart, and counters and hot scores are set directly, so no reconcile
+    pass is needed.
+    """
+    rng = random.Random(seed)
+    sentences = fixture_sentences()
+    provider = get_provider()
+    categoriser = get_categoriser(provider)
+
+    password = make_password('password123')
+    authors = User.objects.bulk_create([
+        User(username=f'bench_user_{i}', password=password, is_moderator=i == 0)
+        for i in range(users)
+    ])
+
+    now = timezone.now()
+    post_ids = []
+    for start in range(0, posts, batch_size):
+        count = min(batch_size, posts - start)
+        texts = [
+            f"{rng.choice(sentences)} {rng.choice(sentences)} Store {rng.randint(100, 999)}."
+            for _ in range(count)
+        ]
+        vectors = provider.embed(texts)
+        categories, _ = categoriser.classify(vectors)
+        likers = [rng.sample(authors, min(likes_per_post, users)) for _ in range(count)]
+        created = [now - timedelta(minutes=start + i) for i in range(count)]
+        hot_scores = ranking.score_at(
+            np.array([len(users_) for users_ in likers]), comments_per_post,
+            np.array([when.timestamp() for when in created]),
+        )
+        batch = Post.objects.bulk_create([
+            Post(
+                author=rng.choice(authors),
+                content=text,
+                category=category,
+                embedding=vector.tolist(),
+                embedding_ann=reduce_embedding(vector),
+                like_count=len(likers[i]),
+                comment_count=comments_per_post,
+                hot_score=float(hot_scores[i]),
+            )
+            for i, (text, vector, category) in enumerate(zip(texts, vectors, categories))
+        ])
+        # created_at is auto_now_add, which bulk_create overwrites, so the
+        # one-minute spacing is applied afterwards.
+        Post.objects.filter(id__in=[post.id for post in batch]).update(created_at=Case(
+            *[When(id=post.id, then=Value(when)) for post, when in zip(batch, created)],
+            output_field=DateTimeField(),
+        ))
+        Comment.objects.bulk_create([
+            Comment(post=post, author=rng.choice(authors), content=rng.choice(COMMENT_TEXTS))
+            for post in batch for _ in range(comments_per_post)
+        ])
+        Like.objects.bulk_create([
+            Like(post=post, user=user) for post, users_ in zip(batch, likers) for user in users_
+        ])
+        post_ids.extend(post.id for post in batch)
+
+    feed_cache.invalidate()
+    return post_ids
+
+
+def summarise(latencies, query_counts):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        'iterations': len(latencies),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'max_ms': round(float(latencies_ms.max()), 3),
+        'queries': int(np.median(query_counts)),
+        'max_queries': int(max(query_counts)),
+    }
+
+
+def measure(request, iterations, warmup):
+    """
+    Calls request() warmup + iterations times and summarises the timed calls.
+    """
+    for _ in range(warmup):
+        request()
+    latencies = []
+    query_counts = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Benchmark request failed with {response.status_code}: {response.content[:200]}")
+        query_counts.append(len(ctx.captured_queries))
+    return summarise(latencies, query_counts)
+
+
+def scenarios(post_ids, seed=0):
+    """
+    The endpoints to time, as {name: (zero-argument request function, settings overrides)}.
+    """
+    rng = random.Random(seed)
+    anonymous = Client()
+    reader = User.objects.filter(username__startswith='bench_user_').order_by('-id').first()
+    token, _ = Token.objects.get_or_create(user=reader)
+    reader_client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    like_target = Post.objects.filter(id__in=post_ids).exclude(author=reader).values_list('id', flat=True).first()
+    comment_target = post_ids[len(post_ids) // 2]
+    second_page = anonymous.get('/api/posts/').json()['next'] or '/api/posts/'
+    words = [word for sentence in fixture_sentences() for word in sentence.split() if len(word) > 5]
+    queries = [' '.join(rng.sample(words, 3)) for _ in range(50)]
+
+    def search(mode):
+        return lambda: anonymous.get('/api/posts/search/', {'q': rng.choice(queries), 'mode': mode, 'limit': 10})
+
+    uncached = {'FEED_CACHE_TTL': 0}
+    return {
+        'feed': (lambda: anonymous.get('/api/posts/'), {}),
+        'feed_uncached': (lambda: anonymous.get('/api/posts/'), uncached),
+        'feed_page_2_uncached': (lambda: anonymous.get(second_page), uncached),
+        'feed_category_uncached': (lambda: anonymous.get('/api/posts/', {'category': 'Hardware'}), uncached),
+        'feed_hot_uncached': (lambda: anonymous.get('/api/posts/', {'sort': 'hot'}), uncached),
+        'comment_list': (lambda: anonymous.get('/api/comments/', {'post': comment_target}), {}),
+        'like_toggle': (lambda: reader_client.post(f'/api/posts/{like_target}/like/'), {}),
+        'search_semantic': (search('semantic'), {}),
+        'search_lexical': (search('lexical'), {}),
+        'search_hybrid': (search('hybrid'), {}),
+    }
+
+
+def run(post_ids, iterations=100, warmup=10, only=None, seed=0):
+    """
+    Times every scenario (or those named in `only`) and returns {name: summary}.
+    """
+    get_query_cache().clear()
+    results = {}
+    for name, (request, overrides) in scenarios(post_ids, seed=seed).items():
+        if only and name not in only:
+            continue
+        with override_settings(**overrides):
+            results[name] = measure(request, iterations, warmup)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """
+    Returns {name: {metric: (baseline, current, change)}} for endpoints in both runs.
+    change is the relative difference for latencies and the absolute one for queries.
+    """
+    report = {}
+    for name, summary in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        report[name] = {}
+        for metric in ('p50_ms', 'p99_ms'):
+            before, after = previous[metric], summary[metric]
+            report[name][metric] = (before, after, (after - before) / before if before else 0.0)
+        report[name]['queries'] = (previous['queries'], summary['queries'], summary['queries'] - previous['queries'])
+    return report
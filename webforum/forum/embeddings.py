@@ -0,0 +1,339 @@
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from google import genai
+
+from .metrics import QUERY_EMBEDDING_CACHE, timer
+from .models import ANN_DIMENSIONS
+
+class EmbeddingProvider:
+    """
+    Base class for embedding backends, selected by settings.EMBEDDING_PROVIDER.
+
+    Subclasses implement _embed_batch (and optionally _aembed_batch) for at most
+    max_batch_size texts; embed()/aembed() split larger inputs. Every vector has
+    `dimensions` entries, and `model` names the vector space, so caches and anchor
+    files built with one provider are never reused by another.
+    """
+    model = None
+    dimensions = 3072
+    max_batch_size = 100
+
+    @property
+    def available(self):
+        """
+        False when the provider cannot be used (e.g. no API key), so background
+        work can skip quietly instead of failing every job.
+        """
+        return True
+
+    def _batches(self, texts):
+        texts = list(texts)
+        return [texts[i:i + self.max_batch_size] for i in range(0, len(texts), self.max_batch_size)]
+
+    def _check(self, texts, vectors):
+        if len(vectors) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+    def embed(self, texts):
+        """
+        Returns one numpy vector per text, in order.
+        """
+        vectors = []
+        for batch in self._batches(texts):
+            vectors.extend(self._check(batch, self._embed_batch(batch)))
+        return vectors
+
+    async def aembed(self, texts):
+        vectors = []
+        for batch in self._batches(texts):
+            vectors.extend(self._check(batch, await self._aembed_batch(batch)))
+        return vectors
+
+    def _embed_batch(self, texts):
+        raise NotImplementedError
+
+    async def _aembed_batch(self, texts):
+        return self._embed_batch(texts)
+
+
+class GeminiProvider(EmbeddingProvider):
+    """
+    Google Gemini embeddings. One genai.Client, and so one HTTP connection pool,
+    is shared by every thread in the process. A client can be passed in for tests.
+    """
+    def __init__(self, model="gemini-embedding-001", dimensions=3072, api_key=None, client=None):
+        self.model = model
+        self.dimensions = dimensions
+        self.api_key = api_key
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    def _api_key(self):
+        return self.api_key or os.getenv("GOOGLE_API_KEY")
+
+    @property
+    def available(self):
+        # The test runner mocks genai.Client, so no key is needed there.
+        return bool(self._client or self._api_key() or 'test' in sys.argv)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai.Client(api_key=self._api_key())
+        return self._client
+
+    def _embed_batch(self, texts):
+        response = self.client.models.embed_content(model=self.model, contents=texts)
+        return [np.array(embedding.values) for embedding in response.embeddings]
+
+    async def _aembed_batch(self, texts):
+        response = await self.client.aio.models.embed_content(model=self.model, contents=texts)
+        return [np.array(embedding.values) for embedding in response.embeddings]
+
+
+class HashingProvider(EmbeddingProvider):
+    """
+    Offline, deterministic encoder for load tests and benchmarks.
+
+    Word unigrams and bigrams are hashed, each to a fixed random Gaussian direction
+    seeded by its hash, and a text's vector is the L2-normalised sum of its features'
+    directions. Texts that share words land near each other, so search and
+    categorisation behave plausibly, and no network call is ever made.
+
+    The vectors are dense, like real embeddings: a sparse bag of words leaves almost
+    every pair of posts orthogonal, which HNSW cannot navigate. All the signal sits in
+    the leading ANN_DIMENSIONS, since search indexes only that prefix
+    (Post.embedding_ann); the remaining dimensions stay zero.
+    """
+    def __init__(self, dimensions=3072, model="local-hashing-v2"):
+        self.model = model
+        self.dimensions = dimensions
+        self.width = min(ANN_DIMENSIONS, dimensions)
+        self.feature_vector = functools.lru_cache(maxsize=8192)(self._feature_vector)
+
+    def _feature_vector(self, feature):
+        seed = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        return np.random.default_rng(seed).standard_normal(self.width, dtype=np.float32)
+
+    def vector_for(self, text):
+        words = re.findall(r'\w+', text.casefold())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in features:
+            vector[:self.width] += self.feature_vector(feature)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed_batch(self, texts):
+        return [self.vector_for(text) for text in texts]
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    """
+    The process-wide provider built from settings.EMBEDDING_PROVIDER.
+    """
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            config = settings.EMBEDDING_PROVIDER
+            _provider = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        return _provider
+
+def reset_provider():
+    """
+    Drops the shared provider so the next get_provider() rebuilds it from settings.
+    """
+    global _provider
+    with _provider_lock:
+        _provider = None
+
+@receiver(setting_changed)
+def _reset_provider_on_setting_change(setting, **kwargs):
+    if setting == 'EMBEDDING_PROVIDER':
+        reset_provider()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU + TTL cache of query embeddings, keyed by model and normalised query text.
+
+    Entries live in process memory first. When `cache_alias` names a Django cache,
+    misses fall through to it, so processes can share each other's embeddings.
+    Counters: `hits` (in-process), `shared_hits` (Django cache), `misses` (API calls),
+    also exported as forum_query_embedding_cache_total at /api/metrics/.
+    """
+    def __init__(self, max_entries=1024, ttl=3600, cache_alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalise(text):
+        return ' '.join(text.casefold().split())
+
+    def key(self, text, model):
+        digest = hashlib.sha256(self.normalise(text).encode()).hexdigest()
+        return f"query-embedding:{model}:{digest}"
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        QUERY_EMBEDDING_CACHE.inc(result='hit')
+        return vector
+
+    def _set_local(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_embed(self, text, model, embed):
+        """
+        Returns the cached vector for text, or calls embed(text) and caches the result.
+        """
+        key = self.key(text, model)
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+
+        if self.cache_alias:
+            stored = caches[self.cache_alias].get(key)
+            if stored is not None:
+                vector = np.frombuffer(stored, dtype=np.float32)
+                self._set_local(key, vector)
+                with self._lock:
+                    self.shared_hits += 1
+                QUERY_EMBEDDING_CACHE.inc(result='shared_hit')
+                return vector
+
+        vector = np.asarray(embed(text), dtype=np.float32)
+        with self._lock:
+            self.misses += 1
+        QUERY_EMBEDDING_CACHE.inc(result='miss')
+        self._set_local(key, vector)
+        if self.cache_alias:
+            caches[self.cache_alias].set(key, vector.tobytes(), self.ttl)
+        return vector
+
+    async def aget_or_embed(self, text, model, embed):
+        """
+        Async variant of get_or_embed; embed(text) must be a coroutine function.
+        """
+        key = self.key(text, model)
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+
+        if self.cache_alias:
+            stored = await caches[self.cache_alias].aget(key)
+            if stored is not None:
+                vector = np.frombuffer(stored, dtype=np.float32)
+                self._set_local(key, vector)
+                with self._lock:
+                    self.shared_hits += 1
+                QUERY_EMBEDDING_CACHE.inc(result='shared_hit')
+                return vector
+
+        vector = np.asarray(await embed(text), dtype=np.float32)
+        with self._lock:
+            self.misses += 1
+        QUERY_EMBEDDING_CACHE.inc(result='miss')
+        self._set_local(key, vector)
+        if self.cache_alias:
+            await caches[self.cache_alias].aset(key, vector.tobytes(), self.ttl)
+        return vector
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache(
+                max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+                cache_alias=settings.QUERY_EMBEDDING_CACHE_ALIAS,
+            )
+        return _query_cache
+
+
+def embed_query(text, provider=None):
+    """
+    Embeds a search query, skipping the API for queries seen recently.
+    """
+    provider = provider or get_provider()
+    if not provider.available:
+        raise RuntimeError(f"Embedding provider {provider.model} is not configured")
+
+    def embed(query):
+        with timer('embed'):
+            return provider.embed([query])[0]
+
+    return get_query_cache().get_or_embed(text, provider.model, embed)
+
+
+async def aembed_query(text, timeout=None, provider=None):
+    """
+    Embeds a search query without blocking the event loop.
+    Raises asyncio.TimeoutError if the API does not answer within `timeout` seconds.
+    """
+    provider = provider or get_provider()
+    if not provider.available:
+        raise RuntimeError(f"Embedding provider {provider.model} is not configured")
+
+    async def embed(query):
+        with timer('embed'):
+            vectors = await asyncio.wait_for(provider.aembed([query]), timeout)
+        return vectors[0]
+
+    return await get_query_cache().aget_or_embed(text, provider.model, embed)
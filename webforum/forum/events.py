@@ -0,0 +1,192 @@
+"""
+Live forum events over Server-Sent Events, fanned out with Postgres LISTEN/NOTIFY.
+
+Writers call publish() inside their transaction. NOTIFY is transactional, so an
+event is delivered only if the write commits, and it reaches every process
+(web workers, process_embeddings) without a separate message broker.
+
+Under ASGI (uvicorn), each serving process keeps one LISTEN connection per event
+loop (a Broadcaster). It copies every notification onto a bounded queue per
+connected client, so a thousand open streams cost one database connection, not a
+thousand. WSGI servers (runserver, mysite.wsgi) get sync_stream() instead, which
+holds a LISTEN connection and a server thread per client: fine for development,
+but production streaming needs the ASGI server.
+
+Event types: post_created, post_categorised, like_count, flagged.
+"""
+import asyncio
+import json
+import weakref
+
+import psycopg
+from django.conf import settings
+from django.db import connection
+
+# NOTIFY payloads must stay under 8000 bytes.
+MAX_PAYLOAD_BYTES = 7900
+
+
+def _encode(event_type, data):
+    payload = json.dumps({'type': event_type, 'data': data}, separators=(',', ':'), default=str)
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        # Too large to send (e.g. a very long post); clients refetch by id.
+        payload = json.dumps({'type': event_type, 'data': {'id': data['id'], 'truncated': True}})
+    return payload
+
+
+def publish(event_type, data):
+    """
+    Queues one event for delivery when the current transaction commits.
+    """
+    publish_many(event_type, [data])
+
+
+def publish_many(event_type, items):
+    """
+    Queues one event per item with a single statement.
+    """
+    if not items:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+            [settings.EVENTS_CHANNEL, [_encode(event_type, data) for data in items]],
+        )
+
+
+def listener_params():
+    """
+    libpq parameters for a dedicated async LISTEN connection, taken from the default database.
+    """
+    params = connection.get_connection_params()
+    for key in ('cursor_factory', 'context', 'prepare_threshold'):
+        params.pop(key, None)
+    return params
+
+
+class Broadcaster:
+    """
+    One LISTEN connection shared by every stream served from an event loop.
+    The connection is opened when the first client subscribes and closed
+    when the last one leaves.
+    """
+    def __init__(self, params):
+        self.params = params
+        self.queues = set()
+        self._task = None
+        self._ready = None
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.queues.add(queue)
+        if self._task is None or self._task.done():
+            self._ready = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._listen())
+        try:
+            await asyncio.shield(self._ready)
+        except Exception:
+            self.unsubscribe(queue)
+            raise
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+        if not self.queues and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _close(self, queue):
+        """
+        Ends one client's stream: drops anything still queued and sends the end marker.
+        """
+        self.queues.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _listen(self):
+        try:
+            async with await psycopg.AsyncConnection.connect(**self.params, autocommit=True) as conn:
+                await conn.execute(f'LISTEN "{settings.EVENTS_CHANNEL}"')
+                self._ready.set_result(None)
+                async for notify in conn.notifies():
+                    for queue in list(self.queues):
+                        try:
+                            queue.put_nowait(notify.payload)
+                        except asyncio.QueueFull:
+                            # A client that stopped reading is cut off rather than
+                            # buffering without bound; it reconnects and refetches.
+                            self._close(queue)
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            else:
+                print(f"Event listener stopped: {e}")
+            for queue in list(self.queues):
+                self._close(queue)
+
+
+_broadcasters = weakref.WeakKeyDictionary()
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = Broadcaster(listener_params())
+    return broadcaster
+
+
+def format_event(payload):
+    """
+    Turns a NOTIFY payload into one SSE message.
+    """
+    message = json.loads(payload)
+    return f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+async def stream(broadcaster, queue):
+    """
+    Yields SSE text for one subscribed client until it disconnects. A comment line
+    is sent every EVENTS_HEARTBEAT_SECONDS so proxies keep the connection open.
+    """
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if payload is None:
+                return
+            yield format_event(payload)
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+def listen():
+    """
+    Opens a blocking LISTEN connection for sync_stream().
+    """
+    conn = psycopg.connect(**listener_params(), autocommit=True)
+    try:
+        conn.execute(f'LISTEN "{settings.EVENTS_CHANNEL}"')
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def sync_stream(conn):
+    """
+    Blocking form of stream() for WSGI, where StreamingHttpResponse would read an
+    async iterator to the end before sending anything. Closes `conn` when the
+    client goes away.
+    """
+    with conn:
+        yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+        while True:
+            for notify in conn.notifies(timeout=settings.EVENTS_HEARTBEAT_SECONDS):
+                yield format_event(notify.payload)
+            yield ": keepalive\n\n"
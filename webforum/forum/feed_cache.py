@@ -0,0 +1,76 @@
+"""
+Read-through cache for the post feed.
+
+Serialized feed pages are stored in the FEED_CACHE_ALIAS cache, keyed by the full
+request URL (category, cursor and page size) and a feed version number. Any write
+that can change a page (a new post, like, comment or flag) bumps the version, so
+every cached page is orphaned at once and left to expire after FEED_CACHE_TTL.
+Nothing in a page depends on who is asking, so all readers share the same entries.
+
+The version only moves in the cache the write went to. With a cache shared by every
+process (e.g. Redis) no stale page is served after a write commits. With the default
+per-process LocMemCache, the other processes keep serving their cached pages for up
+to FEED_CACHE_TTL seconds.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = 'feed:version'
+
+
+def _cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def feed_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1, so a version key that was evicted
+        # never comes back pointing at pages cached before the eviction.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate():
+    """
+    Bumps the feed version now, and again once the current transaction commits,
+    so a reader that rebuilt a page between the two does not keep uncommitted-era data.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def page_key(request):
+    digest = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f"feed:{feed_version()}:{digest}"
+
+
+def cached_page(request, build):
+    """
+    Returns the cached page for this request, or calls build() and caches its result.
+    The key is taken before building, so a write that lands mid-build leaves the
+    result under the old version, where no later reader will find it.
+    """
+    if not settings.FEED_CACHE_TTL:
+        return build()
+    cache = _cache()
+    key = page_key(request)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.FEED_CACHE_TTL)
+    return data
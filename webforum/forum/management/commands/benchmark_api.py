@@ -0,0 +1,95 @@
+import json
+import os
+import platform
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from forum import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway database and reports p50/p99 latency and SQL query counts "
+        "for the feed, search, like and comment endpoints. Results are written as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3, help="Comments per post.")
+        parser.add_argument('--likes', type=int, default=3, help="Likes per post.")
+        parser.add_argument('--iterations', type=int, default=100, help="Timed requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per endpoint.")
+        parser.add_argument('--only', nargs='+', help="Endpoints to run, e.g. feed search_hybrid.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help="Where to write results. Defaults to benchmarks/<commit>.json."
+        )
+        parser.add_argument('--compare', help="A previous results file to diff against.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(f"No results file at {options['compare']}")
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        commit = benchmarks.git_commit()
+        output = options['output'] or os.path.join('benchmarks', f"{commit or 'results'}.json")
+
+        # Everything runs in a fresh test database with the offline embedding provider,
+        # so runs are repeatable and never touch real data or the network.
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                EMBEDDING_PROVIDER=settings.EMBEDDING_PROVIDERS['local'],
+                EMBEDDING_WORKER_IN_PROCESS=False,
+            ):
+                started = time.perf_counter()
+                post_ids = benchmarks.seed(
+                    users=options['users'], posts=options['posts'],
+                    comments_per_post=options['comments'], likes_per_post=options['likes'],
+                    seed=options['seed'],
+                )
+                self.stdout.write(f"Seeded {len(post_ids)} posts in {time.perf_counter() - started:.1f}s.")
+                results = benchmarks.run(
+                    post_ids, iterations=options['iterations'], warmup=options['warmup'],
+                    only=options['only'], seed=options['seed'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"{'endpoint':<24}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for name, summary in results.items():
+            self.stdout.write(
+                f"{name:<24}{summary['p50_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['queries']:>9}"
+            )
+
+        report = {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'config': {key: options[key] for key in ('users', 'posts', 'comments', 'likes', 'iterations', 'warmup', 'seed')},
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+        if baseline:
+            self.stdout.write(f"\nAgainst {baseline.get('commit') or options['compare']}:")
+            for name, metrics in benchmarks.compare(results, baseline['results']).items():
+                p50, p99, queries = metrics['p50_ms'], metrics['p99_ms'], metrics['queries']
+                self.stdout.write(
+                    f"{name:<24}p50 {p50[2]:+.0%}  p99 {p99[2]:+.0%}  queries {queries[0]} -> {queries[1]}"
+                )
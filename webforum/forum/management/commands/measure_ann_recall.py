@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from forum.models import Post, decode_vector
+from forum.search import ann_search, exact_search
+
+
+class Command(BaseCommand):
+    help = "Measures recall@k and latency of the HNSW search path against exact L2 ordering."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=50, help="Number of posts to use as queries.")
+        parser.add_argument('--k', type=int, default=10, help="Result count to compare.")
+        parser.add_argument(
+            '--ef-search', type=int, nargs='+', default=[10, 20, 40, 80, 160],
+            help="hnsw.ef_search values to evaluate."
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        ids = list(queryset.exclude(embedding__isnull=True).values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.WARNING("No embedded posts to measure."))
+            return
+
+        rng = random.Random(options['seed'])
+        sample_ids = rng.sample(ids, min(options['samples'], len(ids)))
+        queries = [
+            decode_vector(data) for _, data in Post.objects.filter(id__in=sample_ids).embedding_vectors()
+        ]
+        k = options['k']
+
+        exact_started = time.perf_counter()
+        truth = [{post.id for post in exact_search(queryset, query, k)} for query in queries]
+        exact_ms = (time.perf_counter() - exact_started) * 1000 / len(queries)
+        self.stdout.write(f"exact: {exact_ms:.2f} ms/query over {len(ids)} embedded posts")
+
+        for ef_search in options['ef_search']:
+            hits = 0
+            started = time.perf_counter()
+            for query, expected in zip(queries, truth):
+                found = {post.id for post in ann_search(queryset, query, k, ef_search=ef_search)}
+                hits += len(expected & found)
+            ann_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            recall = hits / sum(len(expected) for expected in truth)
+            self.stdout.write(f"ef_search={ef_search}: recall@{k}={recall:.3f}, {ann_ms:.2f} ms/query")
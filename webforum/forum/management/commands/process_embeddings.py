@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from forum import worker
+from forum.embeddings import get_provider
+
+
+class Command(BaseCommand):
+    help = "Drains the embedding queue in batches. Runs until interrupted unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+        parser.add_argument('--batch-size', type=int, help="Jobs claimed per cycle.")
+        parser.add_argument('--concurrency', type=int, help="Embedding requests in flight.")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to sleep when idle.")
+
+    def handle(self, *args, **options):
+        provider = get_provider()
+        if not provider.available:
+            self.stderr.write(self.style.ERROR(f"Embedding provider {provider.model} is not configured."))
+            return
+
+        try:
+            self.drain_forever(provider, options)
+        finally:
+            connection.close()
+
+    def drain_forever(self, provider, options):
+        while True:
+            # Like the request cycle: recycle connections that are too old or broken.
+            close_old_connections()
+            started = time.perf_counter()
+            processed = worker.drain(
+                provider=provider,
+                batch_size=options['batch_size'],
+                concurrency=options['concurrency'],
+            )
+            if processed:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"Embedded {processed} posts in {elapsed:.2f}s ({processed / elapsed:.1f} posts/s)")
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
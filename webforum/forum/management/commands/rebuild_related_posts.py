@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum import related
+from forum.models import Post, RelatedPost, decode_vector
+
+
+def vector_chunks(chunk_size):
+    """
+    Streams (ids, matrix) chunks of every embedded post, in id order.
+    """
+    ids = []
+    vectors = []
+    rows = Post.objects.order_by('id').embedding_vectors().iterator(chunk_size=chunk_size)
+    for post_id, data in rows:
+        ids.append(post_id)
+        vectors.append(decode_vector(data))
+        if len(ids) >= chunk_size:
+            yield np.array(ids), np.stack(vectors)
+            ids, vectors = [], []
+    if ids:
+        yield np.array(ids), np.stack(vectors)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes every post's related-posts list exactly, with blocked matrix products "
+        "over all embeddings. The worker keeps the lists approximately current between runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('-k', type=int, help="Neighbours per post. Defaults to RELATED_POSTS_K.")
+        parser.add_argument('--block-size', type=int, default=2048, help="Posts whose neighbours are found per pass.")
+        parser.add_argument('--chunk-size', type=int, default=8192, help="Embeddings compared per matrix product.")
+        parser.add_argument(
+            '--max-memory-mb', type=int, default=2048,
+            help="Keep all embeddings in memory if they fit in this much; otherwise re-read them "
+                 "from the database on every pass.",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        k = options['k'] or settings.RELATED_POSTS_K
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        total = Post.objects.exclude(embedding__isnull=True).count()
+        if not total:
+            self.stdout.write("No embedded posts.")
+            return
+        if total * Post._meta.get_field('embedding').dimensions * 4 <= options['max_memory_mb'] * 2 ** 20:
+            cached = list(vector_chunks(chunk_size))
+            corpus = lambda: cached
+        else:
+            self.stdout.write(f"{total} embeddings exceed --max-memory-mb; streaming them on every pass.")
+            corpus = lambda: vector_chunks(chunk_size)
+
+        def blocks():
+            # Query blocks are cut from one more pass over the corpus.
+            for ids, matrix in corpus():
+                for start in range(0, len(ids), options['block_size']):
+                    yield ids[start:start + options['block_size']], matrix[start:start + options['block_size']]
+
+        written = done = 0
+        # One transaction, so readers see the old lists until the new ones are complete.
+        with transaction.atomic():
+            RelatedPost.objects.all().delete()
+            batch = []
+            for post_id, neighbours in related.compute_neighbours(blocks(), corpus, k):
+                batch.extend(
+                    RelatedPost(post_id=post_id, neighbour_id=neighbour_id, distance=distance)
+                    for neighbour_id, distance in neighbours
+                )
+                done += 1
+                if len(batch) >= options['batch_size']:
+                    RelatedPost.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+                    self.stdout.write(f"{done}/{total} posts in {time.perf_counter() - started:.1f}s")
+            RelatedPost.objects.bulk_create(batch)
+            written += len(batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} neighbours for {total} posts in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from forum import feed_cache
+from forum.anchors import get_categoriser
+from forum.models import Post, VectorSend, decode_vector
+
+
+class Command(BaseCommand):
+    help = "Re-runs anchor categorisation over every embedded post, one matrix operation per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--metric', choices=['l2', 'cosine'], help="Defaults to CATEGORY_METRIC.")
+        parser.add_argument('--dry-run', action='store_true', help="Report changes without saving them.")
+
+    def handle(self, *args, **options):
+        categoriser = get_categoriser(metric=options['metric'])
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        seen = changed = 0
+        rows = (
+            Post.objects.order_by('id')
+            .annotate(vector_bytes=VectorSend('embedding'))
+            .exclude(embedding__isnull=True)
+            .values_list('id', 'category', 'vector_bytes')
+            .iterator(chunk_size=batch_size)
+        )
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                changed += self.process(categoriser, batch, options['dry_run'])
+                seen += len(batch)
+                batch = []
+        if batch:
+            changed += self.process(categoriser, batch, options['dry_run'])
+            seen += len(batch)
+
+        elapsed = time.perf_counter() - started
+        verb = "would change" if options['dry_run'] else "changed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Categorised {seen} posts in {elapsed:.2f}s; {verb} {changed}."
+        ))
+
+    def process(self, categoriser, batch, dry_run):
+        ids, current, data = zip(*batch)
+        categories, _ = categoriser.classify(np.stack([decode_vector(item) for item in data]))
+        updates = [
+            Post(id=post_id, category=category)
+            for post_id, old, category in zip(ids, current, categories)
+            if old != category
+        ]
+        if updates and not dry_run:
+            Post.objects.bulk_update(updates, ['category'])
+            feed_cache.invalidate()
+        return len(updates)
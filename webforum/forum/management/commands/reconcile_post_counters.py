@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from forum import feed_cache
+from forum.models import Post, Like, Comment
+
+
+def count_of(model):
+    """
+    Correlated subquery counting `model` rows that point at the outer post.
+    """
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(n=Count('id')).values('n')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Recomputes Post.like_count and Post.comment_count from the Like and Comment tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        drifted = (
+            Post.objects.alias(actual_likes=count_of(Like), actual_comments=count_of(Comment))
+            .filter(~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments')))
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{drifted.count()} posts have drifted counters.")
+            return
+
+        fixed = Post.objects.filter(pk__in=drifted.values('pk')).update(
+            like_count=count_of(Like),
+            comment_count=count_of(Comment),
+        )
+        if fixed:
+            feed_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters on {fixed} posts."))
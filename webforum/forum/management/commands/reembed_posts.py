@@ -0,0 +1,114 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from forum import feed_cache
+from forum.anchors import get_categoriser
+from forum.embeddings import get_provider
+from forum.models import EmbeddingJob, Post
+from forum.search import reduce_embedding
+from forum.worker import embed_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Embeds and categorises existing posts in bulk: those with no embedding, "
+        "or every post with --all (e.g. after an embedding model change). "
+        "Progress is checkpointed so an interrupted run can resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-embed posts that already have an embedding.")
+        parser.add_argument('--batch-size', type=int, default=256, help="Posts read and written per batch.")
+        parser.add_argument('--concurrency', type=int, help="Embedding requests in flight.")
+        parser.add_argument(
+            '--checkpoint', default='reembed_checkpoint.json',
+            help="File recording the last post id written. Delete it to start over."
+        )
+        parser.add_argument('--limit', type=int, help="Stop after this many posts.")
+
+    def handle(self, *args, **options):
+        provider = get_provider()
+        if not provider.available:
+            raise CommandError(f"Embedding provider {provider.model} is not configured.")
+        categoriser = get_categoriser(provider)
+        concurrency = options['concurrency'] or settings.EMBEDDING_CONCURRENCY
+
+        checkpoint = options['checkpoint']
+        last_id = self.read_checkpoint(checkpoint)
+        queryset = Post.objects.filter(id__gt=last_id).order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(embedding__isnull=True)
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+        if last_id:
+            self.stdout.write(f"Resuming after post {last_id}.")
+
+        started = time.perf_counter()
+        done = 0
+        batch = []
+        # Only id and content are read; a server-side cursor keeps memory flat.
+        for row in queryset.values_list('id', 'content').iterator(chunk_size=options['batch_size']):
+            batch.append(row)
+            if len(batch) >= options['batch_size']:
+                done += self.process(provider, categoriser, batch, concurrency, checkpoint)
+                batch = []
+                self.report(done, started)
+        if batch:
+            done += self.process(provider, categoriser, batch, concurrency, checkpoint)
+            self.report(done, started)
+
+        self.stdout.write(self.style.SUCCESS(f"Finished: {done} posts embedded."))
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def process(self, provider, categoriser, batch, concurrency, checkpoint):
+        ids, texts = zip(*batch)
+        _, results = embed_chunks(provider, list(texts), concurrency)
+
+        vectors = []
+        for result in results:
+            if isinstance(result, Exception):
+                # Keep what succeeded before the failure; the checkpoint lets a rerun pick up from there.
+                self.save(ids[:len(vectors)], vectors, categoriser, checkpoint)
+                raise CommandError(f"Embedding failed after post {self.read_checkpoint(checkpoint)}: {result}")
+            vectors.extend(result)
+
+        self.save(ids, vectors, categoriser, checkpoint)
+        return len(ids)
+
+    def save(self, ids, vectors, categoriser, checkpoint):
+        if not vectors:
+            return
+        categories, _ = categoriser.classify(vectors)
+        posts = [
+            Post(id=post_id, embedding=vector.tolist(), embedding_ann=reduce_embedding(vector), category=category)
+            for post_id, vector, category in zip(ids, vectors, categories)
+        ]
+        with transaction.atomic():
+            Post.objects.bulk_update(posts, ['embedding', 'embedding_ann', 'category'])
+            EmbeddingJob.objects.filter(post_id__in=ids).delete()
+            feed_cache.invalidate()
+        self.write_checkpoint(checkpoint, ids[-1])
+
+    def report(self, done, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{done} posts in {elapsed:.1f}s ({done / elapsed:.1f} posts/s)")
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            return json.load(f)['last_id']
+
+    @staticmethod
+    def write_checkpoint(path, last_id):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(tmp_path, path)
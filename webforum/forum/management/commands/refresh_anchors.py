@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from forum import anchors
+from forum.embeddings import get_provider
+
+
+class Command(BaseCommand):
+    help = "Precomputes category anchor vectors. Only re-embeds descriptions that changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-embed every anchor.")
+
+    def handle(self, *args, **options):
+        provider = get_provider()
+        path = anchors.anchors_path(provider.model)
+        if not options['force'] and anchors.load_anchors(provider.model, path) is not None:
+            self.stdout.write(f"Anchors are up to date ({path.name}).")
+            return
+
+        if not provider.available:
+            self.stderr.write(self.style.ERROR(f"Embedding provider {provider.model} is not configured."))
+            return
+
+        previous = {} if options['force'] else anchors.load_previous_vectors()
+        vectors = anchors.compute_anchors(provider, previous=previous)
+        anchors.save_anchors(vectors, provider.model, path)
+        reused = sum(anchors.description_hash(desc, provider.model) in previous for desc in anchors.ANCHOR_DESCRIPTIONS.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(vectors)} anchors to {path} ({reused} reused, {len(vectors) - reused} embedded)."
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads synthetic users, posts, comments and likes for load testing, streamed in "
+        "with binary COPY. Adds to existing data rather than replacing it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=float, default=3.0, help="Mean comments per post.")
+        parser.add_argument('--likes', type=float, default=5.0, help="Mean likes per post.")
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help="How unevenly posts and engagement are spread over users and posts; 0 is uniform.",
+        )
+        parser.add_argument('--days', type=float, default=365, help="Posts are spread over this many past days.")
+        parser.add_argument(
+            '--vectors', choices=seeding.VECTOR_MODES, default='local',
+            help="local: offline hashing embeddings (searchable); random: unit Gaussian vectors "
+                 "(fastest); none: leave posts unembedded.",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Posts per transaction.")
+        parser.add_argument(
+            '--defer-ann-index', action='store_true',
+            help="Drop the HNSW index during the load and rebuild it at the end. Much faster for large loads.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(totals):
+            elapsed = time.perf_counter() - started
+            rows = totals['posts'] + totals['comments'] + totals['likes']
+            self.stdout.write(
+                f"{totals['posts']} posts, {totals['comments']} comments, {totals['likes']} likes "
+                f"in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+            )
+
+        try:
+            totals = seeding.load(
+                users=options['users'], posts=options['posts'],
+                comments_per_post=options['comments'], likes_per_post=options['likes'],
+                skew=options['skew'], days=options['days'], vectors=options['vectors'],
+                seed=options['seed'], batch_size=options['batch_size'],
+                defer_ann_index=options['defer_ann_index'], progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {totals['users']} users, {totals['posts']} posts, {totals['comments']} comments "
+            f"and {totals['likes']} likes in {time.perf_counter() - started:.1f}s."
+        ))
+        if options['vectors'] == 'none':
+            self.stdout.write("Posts have no embeddings; run `manage.py reembed_posts` to add them.")
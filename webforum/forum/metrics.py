@@ -0,0 +1,224 @@
+"""
+Per-request performance metrics.
+
+PerformanceMiddleware (forum.middleware) opens a RequestTimings for each request.
+While it is open, every SQL statement on any connection is counted and timed by
+record_query, and code can time its own phases with `timer('embed')` or
+`timer('serialize')`. The totals go into the histograms below, labelled by the
+resolved view name (e.g. post-list, post-like, post-search), and are rendered in
+the Prometheus text format by `GET /api/metrics/`.
+
+The registry is per process; with several workers, scrape each of them.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PHASES = ('db', 'embed', 'serialize')
+
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{{{_format_labels(key)}}} {value}"]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def _render_series(self, key, series):
+        labels = _format_labels(key)
+        prefix = f"{labels}," if labels else ""
+        lines = [
+            f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, series['buckets'])
+        ]
+        lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+        lines.append(f"{self.name}_sum{{{labels}}} {series['sum']}")
+        lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return lines
+
+
+REQUESTS = Counter('forum_requests_total', "Requests handled.", ['view', 'method', 'status'])
+REQUEST_SECONDS = Histogram('forum_request_duration_seconds', "Wall time per request.", ['view', 'method'])
+DB_QUERIES = Histogram(
+    'forum_request_db_queries', "SQL statements per request.", ['view', 'method'], buckets=QUERY_COUNT_BUCKETS
+)
+DB_SECONDS = Histogram('forum_request_db_seconds', "Time spent in SQL per request.", ['view', 'method'])
+EMBED_SECONDS = Histogram(
+    'forum_request_embed_seconds', "Time spent waiting on the embedding provider per request.", ['view', 'method']
+)
+SERIALIZE_SECONDS = Histogram(
+    'forum_request_serialize_seconds', "Time spent in serializers per request.", ['view', 'method']
+)
+AUTH_TOKEN_CACHE = Counter(
+    'forum_auth_token_cache_total', "Token authentication cache lookups by result (hit or miss).", ['result']
+)
+QUERY_EMBEDDING_CACHE = Counter(
+    'forum_query_embedding_cache_total',
+    "Search query embedding lookups by result (hit, shared_hit or miss).", ['result'],
+)
+REGISTRY = [
+    REQUESTS, REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, EMBED_SECONDS, SERIALIZE_SECONDS, AUTH_TOKEN_CACHE,
+    QUERY_EMBEDDING_CACHE,
+]
+
+
+class RequestTimings:
+    """
+    Accumulates where one request spent its time. Shared by reference with any
+    threads or tasks the request hands work to, since they copy the context.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.queries = 0
+        self.durations = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Value for the Server-Timing header, in milliseconds.
+        """
+        parts = [f'db;dur={self.durations["db"] * 1000:.1f};desc="{self.queries} queries"']
+        parts.extend(
+            f'{phase};dur={self.durations[phase] * 1000:.1f}'
+            for phase in PHASES[1:] if self.durations[phase]
+        )
+        parts.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current = ContextVar('forum_request_timings', default=None)
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def observe_request(view, method, status, timings):
+    REQUESTS.inc(view=view, method=method, status=status)
+    REQUEST_SECONDS.observe(timings.total, view=view, method=method)
+    DB_QUERIES.observe(timings.queries, view=view, method=method)
+    DB_SECONDS.observe(timings.durations['db'], view=view, method=method)
+    EMBED_SECONDS.observe(timings.durations['embed'], view=view, method=method)
+    SERIALIZE_SECONDS.observe(timings.durations['serialize'], view=view, method=method)
+
+
+@contextmanager
+def timer(phase):
+    """
+    Adds the time spent in the block to the current request's `phase`.
+    Does nothing outside a request (e.g. in the embedding worker).
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that counts and times statements for the current request.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add('db', time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    for metric in REGISTRY:
+        metric.clear()
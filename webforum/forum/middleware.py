@@ -0,0 +1,49 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """
+    Times each request and where it went (SQL, embedding provider, serializers),
+    records the totals per view in forum.metrics and, when PERF_SERVER_TIMING is on,
+    reports them to the client in a Server-Timing header.
+
+    Works under both WSGI and ASGI, so the async search view is not pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        timings.finish()
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.observe_request(view, request.method, response.status_code, timings)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = timings.server_timing()
+        return response
+
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:11
+
+import numpy as np
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations
+
+
+def backfill_embedding_ann(apps, schema_editor):
+    # Populate the companion column before the index is built, so HNSW is
+    # constructed in one pass instead of row by row.
+    Post = apps.get_model('forum', 'Post')
+    batch = []
+    for post in Post.objects.exclude(embedding__isnull=True).iterator(chunk_size=500):
+        prefix = np.asarray(post.embedding, dtype=np.float32)[:768]
+        norm = np.linalg.norm(prefix)
+        post.embedding_ann = prefix / norm if norm else prefix
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ['embedding_ann'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['embedding_ann'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_post_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='embedding_ann',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=768, null=True),
+        ),
+        migrations.RunPython(backfill_embedding_ann, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_ann'], m=16, name='post_embedding_ann_hnsw', opclasses=['vector_l2_ops']),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0009_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField()),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='forum.post')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='forum.post')),
+            ],
+            options={
+                'ordering': ['post', 'distance', 'neighbour'],
+                'indexes': [models.Index(fields=['post', 'distance'], name='related_post_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'neighbour'), name='unique_post_neighbour')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:47
+
+import forum.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0011_like_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=forum.models.initial_hot_score),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', '-hot_score', '-id'], name='post_category_hot_idx'),
+        ),
+        # Score existing posts in the time-anchored log form (see forum.ranking), with
+        # each like and comment anchored at its own created_at. Uses the default weights,
+        # a 12 hour half-life and the 2026-01-01 epoch.
+        migrations.RunSQL(
+            sql="""
+                WITH events AS (
+                    SELECT id AS post_id, 0.0::float8 AS weight_log2, created_at FROM forum_post
+                    UNION ALL
+                    SELECT post_id, 0.0, created_at FROM forum_like
+                    UNION ALL
+                    SELECT post_id, 1.0, created_at FROM forum_comment
+                ), terms AS (
+                    SELECT post_id,
+                           weight_log2 + (extract(epoch FROM created_at)::float8 - 1767225600) / 43200 AS term
+                    FROM events
+                ), scores AS (
+                    SELECT post_id, max(term) AS top, array_agg(term) AS terms FROM terms GROUP BY post_id
+                )
+                UPDATE forum_post SET hot_score = scores.top + ln((
+                    SELECT sum(power(2, GREATEST(term - scores.top, -1000))) FROM unnest(scores.terms) AS term
+                )) / ln(2)
+                FROM scores WHERE forum_post.id = scores.post_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
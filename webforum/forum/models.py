@@ -1,6 +1,18 @@
+import numpy as np
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from pgvector.django import VectorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models, transaction
+from django.utils import timezone
+from pgvector.django import VectorField, HnswIndex
+
+from . import ranking
+
+# pgvector cannot build HNSW/IVFFlat indexes on vectors wider than 2000 dimensions,
+# so we keep a truncated, re-normalised copy of the embedding purely for ANN lookups.
+# gemini-embedding-001 is Matryoshka-trained, so its leading dimensions carry most of the signal.
+ANN_DIMENSIONS = 768
 
 class User(AbstractUser):
     """
@@ -13,6 +25,50 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({'Moderator' if self.is_moderator else 'User'})"
 
+class VectorSend(models.Func):
+    """
+    pgvector's binary send format: a 4-byte header and big-endian float4s.
+    A 3072-dim vector is about 12 KB this way, against about 39 KB as text.
+    """
+    function = 'vector_send'
+    output_field = models.BinaryField()
+
+def decode_vector(data):
+    """
+    Decodes vector_send output into a float32 numpy array without text parsing.
+    """
+    dimensions = int.from_bytes(bytes(data[:2]), 'big')
+    return np.frombuffer(data, dtype='>f4', count=dimensions, offset=4).astype(np.float32)
+
+def initial_hot_score():
+    return ranking.contribution(settings.HOT_SCORE_POST, timezone.now())
+
+class PostQuerySet(models.QuerySet):
+    def with_embeddings(self):
+        """
+        Loads the embedding columns that the default manager defers.
+        """
+        return self.defer(None)
+
+    def embedding_vectors(self, field='embedding'):
+        """
+        (id, bytes) pairs of embedded posts in binary form, for bulk numeric work.
+        Decode each with decode_vector().
+        """
+        return (
+            self.exclude(**{f'{field}__isnull': True})
+            .annotate(vector_bytes=VectorSend(field))
+            .values_list('id', 'vector_bytes')
+        )
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    """
+    Defers the embedding columns. No API response includes them, and decoding
+    3072 floats per row would dominate feed fetches.
+    """
+    def get_queryset(self):
+        return super().get_queryset().defer('embedding', 'embedding_ann', 'search_vector')
+
 class Post(models.Model):
     """
     A forum post. Posts are immutable (cannot be edited/deleted by users).
@@ -22,13 +78,57 @@ class Post(models.Model):
     category = models.CharField(max_length=50, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_misleading = models.BooleanField(default=False)
+
+    # Denormalised engagement counters, maintained with F() updates by the like and
+    # comment endpoints so the feed never aggregates. `reconcile_post_counters` repairs drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    # Time-decayed engagement for the ?sort=hot feed, in the time-anchored log form
+    # described in forum.ranking. Likes and comments adjust it where the counters change.
+    hot_score = models.FloatField(default=initial_hot_score)
     
     # AI Vector field (Option C: Semantic Search)
     # Using 3072 dimensions for compatibility with gemini-embedding-001
     embedding = VectorField(dimensions=3072, null=True, blank=True)
 
+    # Reduced-dimension companion of `embedding`, kept in sync by a pre_save signal.
+    # Only used for candidate retrieval; results are re-ranked on the full vector.
+    embedding_ann = VectorField(dimensions=ANN_DIMENSIONS, null=True, blank=True)
+
+    # Full-text index over content, computed by Postgres on every write.
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = PostManager()
+
     class Meta:
-        ordering = ['-created_at']
+        # id breaks ties between posts created in the same microsecond, giving
+        # keyset pagination a total order.
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_feed_keyset_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='post_category_keyset_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+            models.Index(fields=['category', '-hot_score', '-id'], name='post_category_hot_idx'),
+            GinIndex(fields=['search_vector'], name='post_search_vector_gin'),
+            HnswIndex(
+                name='post_embedding_ann_hnsw',
+                fields=['embedding_ann'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_l2_ops'],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # post_save handlers queue the EmbeddingJob; under autocommit they would run
+        # after the post row had already committed, so a failure there lost the job.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Post by {self.author.username} at {self.created_at}"
@@ -43,11 +143,77 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['created_at']
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_keyset_idx'),
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.id}"
 
+class LikeManager(models.Manager):
+    """
+    Like and unlike as single SQL statements. Each one changes the like row,
+    Post.like_count and Post.hot_score together and returns the new count, so
+    concurrent requests cannot double-count or trip the unique constraint.
+    """
+    def like(self, post_id, user_id):
+        """
+        Likes the post unless the user wrote it or already liked it.
+        Returns (author_id, created, like_count), or None if the post does not exist.
+        """
+        like_table = self.model._meta.db_table
+        post_table = Post._meta.db_table
+        hot_score = ranking.add_sql('hot_score', ranking.contribution_sql(settings.HOT_SCORE_LIKE, 'now()'))
+        sql = f"""
+            WITH target AS (
+                SELECT id, author_id, like_count FROM {post_table} WHERE id = %(post)s
+            ), inserted AS (
+                INSERT INTO {like_table} (post_id, user_id, created_at)
+                SELECT id, %(user)s, now() FROM target WHERE author_id <> %(user)s
+                ON CONFLICT (user_id, post_id) DO NOTHING
+                RETURNING post_id
+            ), counted AS (
+                UPDATE {post_table} SET like_count = like_count + 1, hot_score = {hot_score}
+                WHERE id IN (SELECT post_id FROM inserted)
+                RETURNING like_count
+            )
+            SELECT author_id, EXISTS (SELECT 1 FROM inserted), COALESCE((SELECT like_count FROM counted), like_count)
+            FROM target
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'post': post_id, 'user': user_id})
+            return cursor.fetchone()
+
+    def unlike(self, post_id, user_id):
+        """
+        Removes the user's like if there is one.
+        Returns (deleted, like_count), or None if the post does not exist.
+        """
+        like_table = self.model._meta.db_table
+        post_table = Post._meta.db_table
+        # The like's own term comes out, anchored at when it was made.
+        hot_score = ranking.remove_sql(
+            'hot_score', ranking.contribution_sql(settings.HOT_SCORE_LIKE, '(SELECT created_at FROM deleted)'),
+        )
+        sql = f"""
+            WITH deleted AS (
+                DELETE FROM {like_table} WHERE post_id = %(post)s AND user_id = %(user)s
+                RETURNING post_id, created_at
+            ), counted AS (
+                UPDATE {post_table}
+                SET like_count = like_count - 1, hot_score = {hot_score}
+                WHERE id IN (SELECT post_id FROM deleted)
+                RETURNING like_count
+            )
+            SELECT EXISTS (SELECT 1 FROM deleted), COALESCE((SELECT like_count FROM counted), like_count)
+            FROM {post_table} WHERE id = %(post)s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'post': post_id, 'user': user_id})
+            return cursor.fetchone()
+
 class Like(models.Model):
     """
     A like on a post. Logic ensures one like per post per user.
@@ -57,11 +223,63 @@ class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = LikeManager()
+
     class Meta:
         # Database-level rule: A user can only like a specific post once.
         constraints = [
             models.UniqueConstraint(fields=['user', 'post'], name='unique_user_post_like')
         ]
+        # Incremental exports read likes by created_at watermark.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='like_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes Post {self.post.id}"
+
+class RelatedPost(models.Model):
+    """
+    One entry in a post's precomputed list of nearest posts by embedding distance.
+    Maintained by forum.related: incrementally as posts are embedded, and in full
+    by `manage.py rebuild_related_posts`.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='neighbour_of')
+    # L2 distance between the two full embeddings; smaller is more similar.
+    distance = models.FloatField()
+
+    class Meta:
+        ordering = ['post', 'distance', 'neighbour']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'neighbour'], name='unique_post_neighbour')
+        ]
+        indexes = [
+            models.Index(fields=['post', 'distance'], name='related_post_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.neighbour_id} is related to Post {self.post_id} ({self.distance:.3f})"
+
+class EmbeddingJob(models.Model):
+    """
+    A post waiting to be embedded and categorised.
+    This table is the durable queue drained by forum.worker: rows are created in the
+    same transaction as the post and deleted once the embedding is stored.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='embedding_job')
+    attempts = models.PositiveIntegerField(default=0)
+    # Jobs become claimable at this time. Claiming pushes it forward as a lease,
+    # and failures push it forward by an exponential backoff.
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='embedding_job_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Embedding job for Post {self.post_id} (attempt {self.attempts})"
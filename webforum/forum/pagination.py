@@ -0,0 +1,154 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (key_field, id), created_at by default.
+
+    Unlike DRF's CursorPagination, which keys on the first ordering field and falls
+    back to an OFFSET for ties, the cursor here holds both values, so every page is
+    a range scan on the composite index and deep pages cost the same as the first.
+    Subclasses set `descending` to match the model's Meta.ordering.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    descending = True
+    key_field = 'created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_key(self, value):
+        return value.isoformat()
+
+    def decode_key(self, value):
+        return datetime.fromisoformat(value)
+
+    def encode_cursor(self, instance, reverse):
+        payload = {'t': self.encode_key(getattr(instance, self.key_field)), 'id': instance.pk}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode())
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            return self.decode_key(payload['t']), int(payload['id']), bool(payload.get('r'))
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        # Walking backwards flips the scan direction; the page is re-reversed below.
+        descending = self.descending != reverse
+        field = self.key_field
+        if descending:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        else:
+            queryset = queryset.order_by(field, 'id')
+
+        if cursor:
+            key, pk, _ = cursor
+            if descending:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lte': key}) & (Q(**{f'{field}__lt': key}) | Q(id__lt=pk))
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__gte': key}) & (Q(**{f'{field}__gt': key}) | Q(id__gt=pk))
+                )
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PostFeedPagination(KeysetPagination):
+    """
+    Newest first, matching Post.Meta.ordering.
+    """
+    descending = True
+
+
+class CommentPagination(KeysetPagination):
+    """
+    Oldest first, matching Comment.Meta.ordering.
+    """
+    descending = False
+
+
+class HotFeedPagination(KeysetPagination):
+    """
+    Highest Post.hot_score first, for ?sort=hot. Scores are anchored in time rather
+    than decayed in place (see forum.ranking), so a cursor's score stays comparable;
+    only a post liked or commented on between requests can cross a page boundary.
+    """
+    descending = True
+    key_field = 'hot_score'
+
+    def encode_key(self, value):
+        return value
+
+    def decode_key(self, value):
+        return float(value)
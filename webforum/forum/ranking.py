@@ -0,0 +1,105 @@
+"""
+Hot feed scoring.
+
+A post's heat is the sum of its engagement weights (HOT_SCORE_POST for the post
+itself, HOT_SCORE_LIKE per like, HOT_SCORE_COMMENT per comment), each halved for
+every HOT_SCORE_HALF_LIFE since it happened. Rather than decaying every row over
+time, Post.hot_score holds that sum in log2 form, anchored at HOT_SCORE_EPOCH:
+
+    hot_score = log2(sum(weight * 2 ** half_lives(happened_at)))
+
+A post's heat right now is 2 ** (hot_score - half_lives(now)), so ordering by
+hot_score is ordering by heat at any moment. A score only changes when its own post
+is liked or commented on, which keeps ?sort=hot an index scan on (-hot_score, -id)
+and its cursors valid indefinitely, with no background decay job.
+
+Adding or removing an event is a log-sum-exp step inside the UPDATE. Removal takes
+out the event's own term, anchored at when it happened, so an unlike subtracts what
+is left of the like rather than its full weight.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+# Exponents are clamped here so power(2, x) cannot underflow, which Postgres
+# reports as an error rather than returning zero.
+MIN_EXPONENT = -1000
+
+
+def half_lives(when):
+    """
+    Half-lives between HOT_SCORE_EPOCH and a datetime.
+    """
+    return (when.timestamp() - settings.HOT_SCORE_EPOCH) / settings.HOT_SCORE_HALF_LIFE
+
+
+def contribution(weight, when):
+    """
+    The log2 term an event of `weight` at `when` adds to a score.
+    """
+    return math.log2(weight) + half_lives(when)
+
+
+def contribution_sql(weight, timestamp):
+    """
+    contribution() in SQL, for an event whose time is the SQL expression `timestamp`.
+    """
+    return (
+        f"({math.log2(weight)!r} + (extract(epoch FROM {timestamp})::float8 - {settings.HOT_SCORE_EPOCH!r})"
+        f" / {float(settings.HOT_SCORE_HALF_LIFE)!r})"
+    )
+
+
+def add_sql(column, term):
+    """
+    SQL for log2(2 ** column + 2 ** term).
+    """
+    return (
+        f"GREATEST({column}, {term})"
+        f" + ln(1 + power(2, GREATEST(-abs({column} - {term}), {MIN_EXPONENT}))) / ln(2)"
+    )
+
+
+def remove_sql(column, term, created_at='created_at'):
+    """
+    SQL for log2(2 ** column - 2 ** term). The result never drops below the post's
+    own term, which no like or comment can take away, even if rounding or a stale
+    score leaves less than `term` to remove.
+    """
+    return (
+        f"GREATEST({contribution_sql(settings.HOT_SCORE_POST, created_at)},"
+        f" {column} + ln(GREATEST(1 - power(2, LEAST(GREATEST({term} - {column}, {MIN_EXPONENT}), 0)), 1e-300))"
+        f" / ln(2))"
+    )
+
+
+def engagement(weight, when=None):
+    """
+    Update expression for hot_score: adds an event of `weight` at `when` (default
+    now), or removes it when the weight is negative. Removals need the time the
+    like or comment was made. `when` may also be a list of times, for several
+    events of the same weight at once.
+    """
+    times = when if isinstance(when, list) else [when or timezone.now()]
+    term = float(np.logaddexp2.reduce([contribution(abs(weight), time) for time in times]))
+    if weight < 0:
+        return RawSQL(remove_sql('hot_score', '%s'), [term], output_field=FloatField())
+    return RawSQL(add_sql('hot_score', '%s'), [term, term], output_field=FloatField())
+
+
+def score_at(like_count, comment_count, created):
+    """
+    The score a post would have if its likes and comments all came when it was
+    posted. `created` is in Unix seconds. Works element-wise on NumPy arrays, for
+    bulk loads.
+    """
+    total = (
+        settings.HOT_SCORE_POST
+        + settings.HOT_SCORE_LIKE * np.asarray(like_count)
+        + settings.HOT_SCORE_COMMENT * np.asarray(comment_count)
+    )
+    return np.log2(total) + (np.asarray(created) - settings.HOT_SCORE_EPOCH) / settings.HOT_SCORE_HALF_LIFE
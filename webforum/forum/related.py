@@ -0,0 +1,126 @@
+"""
+Precomputed "related posts" lists.
+
+Each embedded post keeps its RELATED_POSTS_K nearest posts, by L2 distance between
+full embeddings, in the RelatedPost table. GET /api/posts/{id}/related/ is then one
+indexed lookup rather than a vector search.
+
+The worker keeps the lists current as posts are embedded (update_neighbours): a new
+post gets its own list from the ANN index, and it is offered to each of those
+neighbours' lists, displacing their furthest entry. That is approximate, because a
+post can belong in the list of a post outside its own top k. `manage.py
+rebuild_related_posts` recomputes every list exactly (compute_neighbours), streaming
+the embeddings so memory stays bounded however many posts there are.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from pgvector.django import L2Distance
+
+from .models import Post, RelatedPost
+from .search import ann_search
+
+
+def nearest_posts(post_id, vector, k):
+    """
+    The k nearest other embedded posts as (neighbour_id, distance) pairs, nearest first.
+    """
+    queryset = Post.objects.exclude(id=post_id).only('id')
+    with_distance = queryset.annotate(distance=L2Distance('embedding', vector))
+    posts = ann_search(queryset, vector, k, rerank_queryset=with_distance)
+    if len(posts) < k:
+        # The index can come up short, e.g. while dead rows wait for VACUUM, or when
+        # there are fewer than k posts. An exact scan cannot, and then it is small.
+        posts = list(with_distance.exclude(embedding__isnull=True).order_by('distance')[:k])
+    return [(post.id, post.distance) for post in posts]
+
+
+def update_neighbours(vectors, k=None):
+    """
+    Rebuilds the lists of newly embedded posts and adds each post to the lists of
+    its neighbours, trimming those back to k. `vectors` maps post id to its full
+    embedding. Call it in the transaction that stores the embeddings.
+    """
+    k = settings.RELATED_POSTS_K if k is None else k
+    if not k or not vectors:
+        return
+
+    # Keyed by (post, neighbour): two new posts can each find the other.
+    rows = {}
+    for post_id, vector in vectors.items():
+        for neighbour_id, distance in nearest_posts(post_id, vector, k):
+            rows[post_id, neighbour_id] = distance
+            rows[neighbour_id, post_id] = distance
+
+    RelatedPost.objects.filter(post_id__in=list(vectors)).delete()
+    if not rows:
+        return
+    RelatedPost.objects.bulk_create(
+        [RelatedPost(post_id=post_id, neighbour_id=neighbour_id, distance=distance)
+         for (post_id, neighbour_id), distance in rows.items()],
+        update_conflicts=True,
+        unique_fields=['post', 'neighbour'],
+        update_fields=['distance'],
+    )
+    trim({post_id for post_id, _ in rows}, k)
+
+
+def trim(post_ids, k):
+    """
+    Deletes all but the k nearest entries from each of the given posts' lists.
+    """
+    table = RelatedPost._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (PARTITION BY post_id ORDER BY distance, neighbour_id) AS rank
+                    FROM {table} WHERE post_id = ANY(%s)
+                ) ranked
+                WHERE rank > %s
+            )
+            """,
+            [list(post_ids), k],
+        )
+
+
+def compute_neighbours(blocks, corpus, k):
+    """
+    Exact k nearest neighbours for every post, without holding every vector or a
+    full distance row in memory.
+
+    `blocks` yields (ids, matrix) blocks of query posts. `corpus` is a zero-argument
+    callable returning an iterable of (ids, matrix) chunks that covers every post.
+    The corpus is streamed once per block. Each chunk's distances, taken as
+    |a|^2 + |b|^2 - 2ab in one matrix product, are merged into a running top k with
+    np.argpartition, so memory stays at block x chunk distances.
+    Yields (post_id, [(neighbour_id, distance), ...]) with the nearest first.
+    """
+    if k <= 0:
+        return
+    for ids, block in blocks:
+        ids = np.asarray(ids)
+        block_norms = np.einsum('ij,ij->i', block, block)
+        best = np.full((len(ids), k), np.inf, dtype=np.float32)
+        best_ids = np.full((len(ids), k), -1, dtype=np.int64)
+
+        for chunk_ids, chunk in corpus():
+            chunk_ids = np.asarray(chunk_ids)
+            squared = block_norms[:, None] + np.einsum('ij,ij->i', chunk, chunk)[None, :] - 2.0 * (block @ chunk.T)
+            np.maximum(squared, 0.0, out=squared)
+            squared[ids[:, None] == chunk_ids[None, :]] = np.inf  # a post is not its own neighbour
+
+            candidates = np.hstack([best, squared])
+            candidate_ids = np.hstack([best_ids, np.broadcast_to(chunk_ids, squared.shape)])
+            keep = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(candidates, keep, axis=1)
+            best_ids = np.take_along_axis(candidate_ids, keep, axis=1)
+
+        order = np.argsort(best, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        distances = np.sqrt(best)
+        for row, post_id in enumerate(ids.tolist()):
+            found = np.isfinite(best[row])
+            yield post_id, list(zip(best_ids[row][found].tolist(), distances[row][found].tolist()))
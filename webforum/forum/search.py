@@ -0,0 +1,113 @@
+import re
+
+import numpy as np
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from django.db import connection, transaction
+from pgvector.django import L2Distance
+
+from .models import ANN_DIMENSIONS
+
+
+def reduce_embedding(vector):
+    """
+    Truncates a full embedding to its leading ANN_DIMENSIONS and re-normalises it,
+    producing the vector stored in Post.embedding_ann.
+    """
+    if vector is None:
+        return None
+    prefix = np.asarray(vector, dtype=np.float32)[:ANN_DIMENSIONS]
+    norm = np.linalg.norm(prefix)
+    return prefix / norm if norm else prefix
+
+
+def exact_search(queryset, query_vector, limit):
+    """
+    Brute-force ordering by L2 distance over the full 3072-dim embedding.
+    This is the ground truth the ANN path is measured against.
+    """
+    return list(
+        queryset.exclude(embedding__isnull=True)
+        .order_by(L2Distance('embedding', query_vector))[:limit]
+    )
+
+
+def ann_search(queryset, query_vector, limit, ef_search=None, rerank_queryset=None):
+    """
+    Two-stage semantic search:
+    1. Pull candidates from the HNSW index on the reduced embedding_ann column.
+    2. Re-rank those candidates by exact distance on the full embedding.
+
+    ef_search trades recall for latency; it is clamped so the index can return
+    at least as many candidates as we ask for.
+    rerank_queryset (default: queryset) is where the final rows are read from. Pass
+    joins and aggregates there, since they would stop the candidate query using the index.
+    """
+    candidates = max(limit * settings.ANN_CANDIDATE_MULTIPLIER, limit)
+    ef_search = max(ef_search or settings.ANN_EF_SEARCH, candidates)
+
+    with transaction.atomic():
+        # SET LOCAL scopes the setting to this transaction, so pooled connections are unaffected.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL hnsw.ef_search = %s', [int(ef_search)])
+        candidate_ids = list(
+            queryset.exclude(embedding_ann__isnull=True)
+            .order_by(L2Distance('embedding_ann', reduce_embedding(query_vector)))
+            .values_list('id', flat=True)[:candidates]
+        )
+
+    rerank_queryset = queryset if rerank_queryset is None else rerank_queryset
+    return list(
+        rerank_queryset.filter(id__in=candidate_ids)
+        .order_by(L2Distance('embedding', query_vector))[:limit]
+    )
+
+
+def lexical_search(queryset, query_text, limit):
+    """
+    Full-text search over the GIN-indexed search_vector, best ts_rank first.
+    websearch syntax lets users quote phrases ("heat sink") or exclude words (-led).
+    """
+    query = SearchQuery(query_text, config='english', search_type='websearch')
+    return list(
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-created_at', '-id')[:limit]
+    )
+
+
+# A quoted phrase, or a single token containing a digit (a part number such as
+# SPR-2041 or a store id), is treated as an exact lookup.
+EXACT_QUERY = re.compile(r'^\s*(".+"|(?=\S*\d)[\w./-]+)\s*$')
+
+def is_exact_query(query_text):
+    return bool(EXACT_QUERY.match(query_text))
+
+
+def reciprocal_rank_fusion(*rankings, k=None):
+    """
+    Merges ranked lists of posts: each post scores sum(1 / (k + rank)) over the lists
+    it appears in. Rank positions are used rather than raw scores, so BM25-style ranks
+    and vector distances need no common scale.
+    """
+    k = settings.HYBRID_RRF_K if k is None else k
+    scores = {}
+    posts = {}
+    for ranking in rankings:
+        for rank, post in enumerate(ranking, start=1):
+            scores[post.id] = scores.get(post.id, 0.0) + 1.0 / (k + rank)
+            posts.setdefault(post.id, post)
+    ordered = sorted(scores, key=lambda post_id: scores[post_id], reverse=True)
+    return [posts[post_id] for post_id in ordered]
+
+
+def recall_at_k(queryset, query_vector, k, ef_search=None):
+    """
+    Fraction of the exact top-k that the ANN path also returns.
+    """
+    expected = {post.id for post in exact_search(queryset, query_vector, k)}
+    if not expected:
+        return 1.0
+    found = {post.id for post in ann_search(queryset, query_vector, k, ef_search=ef_search)}
+    return len(expected & found) / len(expected)
@@ -0,0 +1,248 @@
+"""
+Synthetic forum data at load-test scale, bulk-loaded with COPY.
+
+load() creates users with bulk_create, then generates posts in batches. For each
+batch it also generates the batch's comments and likes, and streams all three to
+Postgres with psycopg's binary COPY. Binary COPY sends a 3072-dim embedding as
+12 KB of floats instead of a parsed text literal, and skips per-row INSERT
+overhead, so millions of rows load in minutes.
+
+`skew` shapes the data like a real forum. Authors are drawn from a Zipf-like
+distribution, so a few users write most posts. Each post gets a lognormal
+popularity that scales its expected likes and comments. skew=0 makes both uniform.
+
+COPY bypasses model signals, so no embedding jobs are queued and related-post
+lists are not built. Run `reembed_posts` after loading with vectors='none', and
+`rebuild_related_posts` if the related endpoint is under test.
+"""
+import secrets
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from pgvector.psycopg.vector import register_vector_info
+from psycopg.types import TypeInfo
+
+from . import feed_cache, ranking
+from .anchors import ANCHOR_DESCRIPTIONS, get_categoriser
+from .benchmarks import COMMENT_TEXTS, fixture_sentences
+from .embeddings import HashingProvider
+from .models import ANN_DIMENSIONS, Comment, Like, Post, User
+
+VECTOR_MODES = ('local', 'random', 'none')
+ANN_INDEX_NAME = 'post_embedding_ann_hnsw'
+
+POST_COLUMNS = (
+    ('id', 'int8'), ('author_id', 'int8'), ('content', 'text'), ('category', 'varchar'),
+    ('created_at', 'timestamptz'), ('is_misleading', 'bool'), ('like_count', 'int4'),
+    ('comment_count', 'int4'), ('embedding', 'vector'), ('embedding_ann', 'vector'), ('hot_score', 'float8'),
+)
+COMMENT_COLUMNS = (
+    ('post_id', 'int8'), ('author_id', 'int8'), ('content', 'text'), ('created_at', 'timestamptz'),
+)
+LIKE_COLUMNS = (('post_id', 'int8'), ('user_id', 'int8'), ('created_at', 'timestamptz'))
+
+
+def author_weights(count, skew, rng):
+    """
+    Zipf-like activity weights, 1 / rank^skew over a random ranking of the users.
+    """
+    ranks = rng.permutation(count) + 1
+    weights = ranks.astype(np.float64) ** -skew
+    return weights / weights.sum()
+
+
+def popularity(count, skew, rng):
+    """
+    Lognormal multipliers with mean 1; larger skew gives a longer tail of viral posts.
+    """
+    return rng.lognormal(-skew ** 2 / 2, skew, count)
+
+
+def reduce_embeddings(matrix):
+    """
+    Row-wise search.reduce_embedding: leading ANN_DIMENSIONS, re-normalised.
+    """
+    prefix = matrix[:, :ANN_DIMENSIONS]
+    norms = np.linalg.norm(prefix, axis=1, keepdims=True)
+    return prefix / np.where(norms == 0, 1, norms)
+
+
+def reserve_ids(model, count):
+    """
+    Takes `count` ids from the table's sequence, so rows loaded by COPY can be
+    referenced before they exist.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, 'id', count],
+        )
+        return np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+
+
+def copy_rows(cursor, model, columns, rows):
+    """
+    Streams rows into the model's table with binary COPY.
+    """
+    names = ', '.join(model._meta.get_field(name).column for name, _ in columns)
+    with cursor.copy(f'COPY {model._meta.db_table} ({names}) FROM STDIN (FORMAT BINARY)') as copy:
+        copy.set_types([type_name for _, type_name in columns])
+        for row in rows:
+            copy.write_row(row)
+
+
+def create_users(count, batch_size=5000):
+    """
+    Creates `count` users sharing one password hash ('password123') and returns their ids.
+    Usernames carry a random run prefix, so repeated loads do not collide.
+    """
+    run = secrets.token_hex(3)
+    password = make_password('password123')
+    ids = []
+    for start in range(0, count, batch_size):
+        users = User.objects.bulk_create([
+            User(username=f'seed_{run}_{i}', password=password, is_moderator=i % 100 == 0)
+            for i in range(start, min(start + batch_size, count))
+        ])
+        ids.extend(user.id for user in users)
+    return np.array(ids, dtype=np.int64)
+
+
+class Loader:
+    """
+    Generates and loads one batch of posts (with their comments and likes) at a time.
+    """
+    def __init__(self, user_ids, posts, comments_per_post, likes_per_post, skew, days, vectors, seed):
+        self.user_ids = user_ids
+        self.posts = posts
+        self.comments_per_post = comments_per_post
+        self.likes_per_post = likes_per_post
+        self.skew = skew
+        self.span = days * 86400
+        self.vectors = vectors
+        self.seed = seed
+        self.now = timezone.now()
+        self.sentences = np.array(fixture_sentences(), dtype=object)
+        self.comment_texts = np.array(COMMENT_TEXTS, dtype=object)
+        self.author_weights = author_weights(len(user_ids), skew, np.random.default_rng(seed))
+        self.provider = HashingProvider()
+        self.categoriser = get_categoriser(self.provider) if vectors != 'none' else None
+
+    def embeddings(self, texts, rng):
+        if self.vectors == 'local':
+            return np.stack(self.provider.embed(list(texts)))
+        matrix = rng.standard_normal((len(texts), self.provider.dimensions), dtype=np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def load_batch(self, cursor, start, count):
+        """
+        Loads posts [start, start + count) of the run. Returns (posts, comments, likes) written.
+        """
+        rng = np.random.default_rng([self.seed, start])
+        users = len(self.user_ids)
+        post_ids = reserve_ids(Post, count)
+        author_index = rng.choice(users, size=count, p=self.author_weights)
+
+        # Oldest first, so ids rise with created_at as they would in production.
+        position = (start + np.arange(count) + rng.random(count)) / self.posts
+        ages = (1.0 - position) * self.span
+        created = [self.now - timedelta(seconds=age) for age in ages.tolist()]
+
+        texts = [
+            f"{a} {b} Store {n}."
+            for a, b, n in zip(
+                rng.choice(self.sentences, count), rng.choice(self.sentences, count),
+                rng.integers(100, 1000, count).tolist(),
+            )
+        ]
+        if self.vectors == 'none':
+            embeddings = reduced = [None] * count
+            categories = rng.choice(list(ANCHOR_DESCRIPTIONS), count).tolist()
+        else:
+            matrix = self.embeddings(texts, rng)
+            categories, _ = self.categoriser.classify(matrix)
+            embeddings, reduced = matrix, reduce_embeddings(matrix)
+
+        weight = popularity(count, self.skew, rng)
+        like_counts = np.minimum(rng.poisson(self.likes_per_post * weight), users - 1)
+        comment_counts = rng.poisson(self.comments_per_post * weight)
+        hot_scores = ranking.score_at(like_counts, comment_counts, self.now.timestamp() - ages)
+        misleading = rng.random(count) < 0.01
+
+        copy_rows(cursor, Post, POST_COLUMNS, zip(
+            post_ids.tolist(), self.user_ids[author_index].tolist(), texts, categories, created,
+            misleading.tolist(), like_counts.tolist(), comment_counts.tolist(),
+            embeddings, reduced, hot_scores.tolist(),
+        ))
+
+        # Comments arrive over the hours after their post, never in the future.
+        comment_post = np.repeat(np.arange(count), comment_counts)
+        delays = np.minimum(rng.exponential(6 * 3600, len(comment_post)), ages[comment_post])
+        copy_rows(cursor, Comment, COMMENT_COLUMNS, zip(
+            post_ids[comment_post].tolist(),
+            self.user_ids[rng.choice(users, size=len(comment_post), p=self.author_weights)].tolist(),
+            rng.choice(self.comment_texts, len(comment_post)).tolist(),
+            [created[i] + timedelta(seconds=d) for i, d in zip(comment_post.tolist(), delays.tolist())],
+        ))
+
+        # Each post's likers are a run of consecutive users after a random offset, skipping
+        # the author, so they are distinct and never include the author.
+        like_post = np.repeat(np.arange(count), like_counts)
+        within = np.arange(len(like_post)) - np.repeat(np.cumsum(like_counts) - like_counts, like_counts)
+        offsets = rng.integers(0, users - 1, count) if users > 1 else np.zeros(count, dtype=np.int64)
+        liker_index = (author_index[like_post] + 1 + (offsets[like_post] + within) % (users - 1)) % users
+        delays = np.minimum(rng.exponential(12 * 3600, len(like_post)), ages[like_post])
+        copy_rows(cursor, Like, LIKE_COLUMNS, zip(
+            post_ids[like_post].tolist(),
+            self.user_ids[liker_index].tolist(),
+            [created[i] + timedelta(seconds=d) for i, d in zip(like_post.tolist(), delays.tolist())],
+        ))
+        return count, len(comment_post), len(like_post)
+
+
+def load(users=1000, posts=100_000, comments_per_post=3.0, likes_per_post=5.0, skew=1.0, days=365,
+         vectors='local', seed=0, batch_size=10_000, defer_ann_index=False, progress=None):
+    """
+    Creates users, then posts, comments and likes, one transaction per batch of posts.
+    With defer_ann_index the HNSW index is dropped during the load and rebuilt once at
+    the end, which is far faster than inserting every vector into the graph.
+    progress(totals) is called after each batch. Returns the totals written.
+    """
+    if vectors not in VECTOR_MODES:
+        raise ValueError(f"vectors must be one of {', '.join(VECTOR_MODES)}")
+    if users < 2:
+        raise ValueError("At least two users are needed, since authors cannot like their own posts.")
+
+    totals = {'users': 0, 'posts': 0, 'comments': 0, 'likes': 0}
+    user_ids = create_users(users)
+    totals['users'] = len(user_ids)
+    loader = Loader(user_ids, posts, comments_per_post, likes_per_post, skew, days, vectors, seed)
+
+    ann_index = next(index for index in Post._meta.indexes if index.name == ANN_INDEX_NAME)
+    if defer_ann_index:
+        with connection.schema_editor() as editor:
+            editor.remove_index(Post, ann_index)
+    try:
+        connection.ensure_connection()
+        with connection.connection.cursor() as cursor:
+            # Vector adapters go on this cursor only, leaving Django's connection as it was.
+            register_vector_info(cursor, TypeInfo.fetch(connection.connection, 'vector'))
+            for start in range(0, posts, batch_size):
+                with transaction.atomic():
+                    written = loader.load_batch(cursor, start, min(batch_size, posts - start))
+                for key, count in zip(('posts', 'comments', 'likes'), written):
+                    totals[key] += count
+                if progress:
+                    progress(totals)
+    finally:
+        if defer_ann_index:
+            with connection.schema_editor() as editor:
+                editor.add_index(Post, ann_index)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Post._meta.db_table}, {Comment._meta.db_table}, {Like._meta.db_table}')
+    feed_cache.invalidate()
+    return totals
@@ -1,5 +1,27 @@
 from rest_framework import serializers
 from .models import User, Post, Comment, Like
+from .metrics import timer
+
+class TimedSerializerMixin:
+    """
+    Counts time spent turning instances into JSON towards the request's
+    'serialize' phase (see forum.metrics).
+    """
+    def to_representation(self, instance):
+        with timer('serialize'):
+            return super().to_representation(instance)
+
+class EditedFieldsMixin:
+    """
+    Updates save only the fields the request changed. A full-row save would write
+    back counters read before the request (like_count, comment_count, hot_score)
+    over concurrent F() increments.
+    """
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -9,7 +31,7 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'is_moderator']
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(EditedFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """
     Translates Comment model to/from JSON.
     Includes the author's username for the frontend.
@@ -21,14 +43,22 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'post', 'author', 'author_username', 'content', 'created_at']
         read_only_fields = ['author', 'created_at']
 
-class PostSerializer(serializers.ModelSerializer):
+    def get_fields(self):
+        """
+        A comment stays on the post it was made on: comment_count and hot_score
+        only change on create and delete, so moving one would leave both posts wrong.
+        """
+        fields = super().get_fields()
+        if self.instance is not None:
+            fields['post'].read_only = True
+        return fields
+
+class PostSerializer(EditedFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """
     Translates Post model to/from JSON.
-    Includes calculated counts for engagement metrics.
+    Includes stored counts for engagement metrics.
     """
     author_username = serializers.ReadOnlyField(source='author.username')
-    like_count = serializers.SerializerMethodField()
-    comment_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -37,10 +67,13 @@ class PostSerializer(serializers.ModelSerializer):
             'created_at', 'is_misleading', 'like_count', 'comment_count',
             'category'
         ]
-        read_only_fields = ['author', 'created_at', 'is_misleading', 'category']
-
-    def get_like_count(self, obj):
-        return obj.likes.count()
+        read_only_fields = [
+            'author', 'created_at', 'is_misleading', 'category', 'like_count', 'comment_count'
+        ]
 
-    def get_comment_count(self, obj):
-        return obj.comments.count()
+class BulkCommentSerializer(CommentSerializer):
+    """
+    Input side of bulk comment creation. The post is taken as a plain id and the
+    whole batch is checked with one query in the view, instead of one lookup per item.
+    """
+    post = serializers.IntegerField(min_value=1)
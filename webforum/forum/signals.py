@@ -1,77 +1,66 @@
-import threading
-import os
-import sys
-import numpy as np
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.db import transaction
-from .models import Post
-from google import genai
+from rest_framework.authtoken.models import Token
+from .models import Post, Comment, Like, User
+from .search import reduce_embedding
+from .serializers import PostSerializer
+from . import authentication, events, feed_cache, worker
 
-# 1. Refined Anchor Descriptions for clear differentiation
-ANCHOR_DESCRIPTIONS = {
-    "Q&A": "Questions from users seeking help, troubleshooting tips, or technical support. Contains phrases like 'How do I', 'Help needed', or 'Problem with'.",
-    "News": "Official announcements, press releases, company updates, and news regarding new Barrows store openings or product launches.",
-    "ConnectOS": "Deep technical discussions about software engineering, API integration, cloud latency, WebSocket stability, and backend architecture.",
-    "Hardware": "Physical device installation, heat dissipation issues, LED hardware, SPIRITS units, and mechanical mounting on retail shelves."
-}
+@receiver(pre_save, sender=Post)
+def sync_ann_embedding(sender, instance, **kwargs):
+    """
+    Keeps the reduced ANN vector in step with the full embedding.
+    Runs on raw saves too, so fixtures loaded with loaddata are indexed.
+    Skipped when the embedding was deferred, as it cannot have changed.
+    """
+    if 'embedding' in instance.get_deferred_fields():
+        return
+    instance.embedding_ann = reduce_embedding(instance.embedding)
 
-ANCHOR_CACHE = {}
-
-def get_anchor_vectors(client):
-    if not ANCHOR_CACHE:
-        print("Initialising Barrows Semantic Anchors...")
-        for name, desc in ANCHOR_DESCRIPTIONS.items():
-            res = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents=desc
-            )
-            ANCHOR_CACHE[name] = np.array(res.embeddings[0].values)
-    return ANCHOR_CACHE
-
-def generate_post_embedding(post_id):
-    try:
-        post = Post.objects.get(id=post_id)
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key and 'test' not in sys.argv:
-            return
-
-        client = genai.Client(api_key=api_key)
-        
-        # Get Post Vector
-        response = client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=post.content
-        )
-        post_vector = np.array(response.embeddings[0].values)
-        post.embedding = post_vector.tolist()
-
-        # KNN Categorization
-        anchors = get_anchor_vectors(client)
-        best_category = "Uncategorized"
-        min_distance = float('inf')
+@receiver(post_save, sender=Post)
+def trigger_ai_embedding(sender, instance, created, **kwargs):
+    """
+    Queues new posts for embedding. Post.save() runs inside an atomic block, so the
+    job row commits with the post and nothing is lost if the process dies in between.
+    """
+    if created and instance.embedding is None:
+        worker.enqueue([instance])
 
-        for name, anchor_vector in anchors.items():
-            distance = np.linalg.norm(post_vector - anchor_vector)
-            if distance < min_distance:
-                min_distance = distance
-                best_category = name
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, raw, **kwargs):
+    """
+    Announces new posts on the live event stream. Fixture loads are skipped.
+    """
+    if created and not raw:
+        events.publish('post_created', PostSerializer(instance).data)
 
-        post.category = best_category
-        post.save()
-        print(f"Success: Embedded and categorized post {post_id} as [{best_category}].")
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def invalidate_feed(sender, **kwargs):
+    """
+    New posts, flags, likes and comments all change what a feed page shows.
+    """
+    feed_cache.invalidate()
 
-    except Exception as e:
-        print(f"Categorization failed for post {post_id}: {e}")
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    """
+    Rotated or revoked tokens stop working on the next request.
+    """
+    authentication.forget_tokens([instance.key])
 
-@receiver(post_save, sender=Post)
-def trigger_ai_embedding(sender, instance, created, **kwargs):
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user_tokens(sender, instance, created=False, **kwargs):
+    """
+    Cached credentials carry the user row, so changes such as is_moderator or
+    is_active must not wait for the cache TTL.
+    """
     if created:
-        def start_thread():
-            thread = threading.Thread(
-                target=generate_post_embedding, 
-                args=(instance.id,),
-                name=f"AI_Embedding_{instance.id}"
-            )
-            thread.start()
-        transaction.on_commit(start_thread)
+        return
+    authentication.forget_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
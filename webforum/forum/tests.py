@@ -1,13 +1,77 @@
-from django.test import TransactionTestCase
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from datetime import timedelta
+from pathlib import Path
+import tempfile
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Post
-from unittest.mock import patch, MagicMock
+from django.core.management import call_command, CommandError
+from io import StringIO
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+from .models import Post, Comment, Like, EmbeddingJob, RelatedPost, ANN_DIMENSIONS, decode_vector
+from .embeddings import (
+    GeminiProvider, HashingProvider, QueryEmbeddingCache,
+    get_provider, get_query_cache, reset_provider,
+)
+from . import anchors, benchmarks, events, export, feed_cache, metrics, ranking, related, seeding, worker
+from django.core.cache import cache
+from .search import exact_search, recall_at_k, reciprocal_rank_fusion, reduce_embedding
+from .anchors import Categoriser
+from unittest.mock import patch, MagicMock, AsyncMock
+from asgiref.sync import sync_to_async
+import psycopg
+import asyncio
+import hashlib
+import numpy as np
+import json
+import os
 import threading
+import time
+from types import SimpleNamespace
 
 User = get_user_model()
+LOCAL_PROVIDER = settings.EMBEDDING_PROVIDERS['local']
+
+class FakeEmbeddingClient:
+    """
+    Offline stand-in for genai.Client with the same models.embed_content shape
+    (sync and aio), for exercising GeminiProvider without the network.
+    Vectors are derived from a hash of the text, so they are deterministic
+    and unit-length. Records every call for assertions.
+    """
+    def __init__(self, dimensions=3072, fail_times=0):
+        self.dimensions = dimensions
+        self.fail_times = fail_times
+        self.calls = []
+        self.models = SimpleNamespace(embed_content=self.embed_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(embed_content=self.aembed_content))
+
+    def vector_for(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).normal(size=self.dimensions)
+        return vector / np.linalg.norm(vector)
+
+    def embed_content(self, model, contents):
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        self.calls.append(texts)
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionError("Fake embedding client failure")
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=self.vector_for(text).tolist()) for text in texts
+        ])
+
+    async def aembed_content(self, model, contents):
+        return self.embed_content(model, contents)
+
 
 class PostAITest(TransactionTestCase):
     def setUp(self):
+        reset_provider()
         self.user = User.objects.create_user(username='tester', password='password123')
 
     @patch('google.genai.Client')
@@ -20,10 +84,12 @@ class PostAITest(TransactionTestCase):
         mock_client = MagicMock()
         mock_client_class.return_value = mock_client
         
-        # 2. Define the fake response with .embeddings[0].values
-        fake_response = MagicMock()
-        fake_response.embeddings = [MagicMock(values=[0.1] * 3072)]
-        mock_client.models.embed_content.return_value = fake_response
+        # 2. Define the fake response with one .embeddings[i].values per content
+        def fake_embed_content(model, contents):
+            fake_response = MagicMock()
+            fake_response.embeddings = [MagicMock(values=[0.1] * 3072) for _ in contents]
+            return fake_response
+        mock_client.models.embed_content.side_effect = fake_embed_content
 
         # 3. Create the post (starts the thread)
         post = Post.objects.create(
@@ -42,3 +108,1272 @@ class PostAITest(TransactionTestCase):
         self.assertEqual(len(post.embedding), 3072)
         self.assertTrue(mock_client.models.embed_content.called, "The AI embedding API was not called.")
         print(f"Test Success: Background thread with new SDK updated Post {post.id}.")
+
+
+class SemanticSearchTest(APITestCase):
+    def setUp(self):
+        get_query_cache().clear()
+        reset_provider()
+        self.user = User.objects.create_user(username='searcher', password='password123')
+        rng = np.random.default_rng(42)
+        self.vectors = rng.normal(size=(40, 3072))
+        self.vectors /= np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.posts = [
+            Post.objects.create(author=self.user, content=f"Post {i}", embedding=vector.tolist())
+            for i, vector in enumerate(self.vectors)
+        ]
+
+    def test_embedding_ann_is_kept_in_sync(self):
+        post = self.posts[0]
+        post.refresh_from_db()
+        self.assertEqual(len(post.embedding_ann), ANN_DIMENSIONS)
+        self.assertAlmostEqual(float(np.linalg.norm(post.embedding_ann)), 1.0, places=5)
+
+    @patch('google.genai.Client')
+    def test_search_matches_exact_ordering(self, mock_client_class):
+        query = self.vectors[7] + 0.01
+        fake_response = MagicMock()
+        fake_response.embeddings = [MagicMock(values=query.tolist())]
+        mock_client_class.return_value.aio.models.embed_content = AsyncMock(return_value=fake_response)
+
+        response = self.client.get('/api/posts/search/', {'q': 'anything', 'ef_search': 100})
+
+        self.assertEqual(response.status_code, 200)
+        expected = [post.id for post in exact_search(Post.objects.all(), query.tolist(), 2)]
+        self.assertEqual([post['id'] for post in response.json()], expected)
+        self.assertEqual(recall_at_k(Post.objects.all(), query.tolist(), 10, ef_search=100), 1.0)
+
+    @patch('google.genai.Client')
+    def test_repeated_queries_skip_the_embedding_api(self, mock_client_class):
+        fake_response = MagicMock()
+        fake_response.embeddings = [MagicMock(values=self.vectors[3].tolist())]
+        embed_content = AsyncMock(return_value=fake_response)
+        mock_client_class.return_value.aio.models.embed_content = embed_content
+
+        for query in ['payment point', 'Payment  Point', ' payment point ']:
+            response = self.client.get('/api/posts/search/', {'q': query})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(embed_content.call_count, 1)
+        self.assertEqual(get_query_cache().stats()['hits'], 2)
+
+    def test_search_rejects_invalid_ef_search(self):
+        response = self.client.get('/api/posts/search/', {'q': 'anything', 'ef_search': 'lots'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EmbeddingWorkerTest(APITestCase):
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+        self.user = User.objects.create_user(username='writer', password='password123')
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_post_creation_enqueues_job(self):
+        post = Post.objects.create(author=self.user, content="Queued post")
+        self.assertTrue(EmbeddingJob.objects.filter(post=post).exists())
+
+    def test_failed_job_insert_rolls_back_the_post(self):
+        self.client.force_authenticate(self.user)
+        with patch('forum.worker.EmbeddingJob.objects.bulk_create', side_effect=DatabaseError("queue down")):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/posts/', {'content': "Never queued"})
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(author=self.user, content="Never queued either")
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(EMBEDDING_REQUEST_SIZE=2)
+    def test_drain_embeds_in_batches(self):
+        posts = [Post.objects.create(author=self.user, content=f"Post {i}") for i in range(5)]
+        client = FakeEmbeddingClient()
+
+        processed = worker.drain(provider=GeminiProvider(client=client))
+
+        self.assertEqual(processed, 5)
+        self.assertFalse(EmbeddingJob.objects.exists())
+        # One request for the anchors, then 5 posts in requests of at most 2 texts.
+        post_calls = [texts for texts in client.calls if len(texts) <= 2 and texts[0].startswith("Post")]
+        self.assertEqual(sorted(len(texts) for texts in post_calls), [1, 2, 2])
+        for post in posts:
+            post.refresh_from_db()
+            self.assertEqual(len(post.embedding), 3072)
+            self.assertIn(post.category, anchors.ANCHOR_DESCRIPTIONS)
+
+    def test_failed_batch_is_rescheduled_with_backoff(self):
+        post = Post.objects.create(author=self.user, content="Unlucky post")
+
+        provider = GeminiProvider(client=FakeEmbeddingClient())
+        anchors.get_anchor_vectors(provider)
+
+        with patch.object(provider, 'embed', side_effect=ConnectionError("upstream down")):
+            processed = worker.drain(provider=provider)
+
+        self.assertEqual(processed, 0)
+        job = EmbeddingJob.objects.get(post=post)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertIn("upstream down", job.last_error)
+        post.refresh_from_db()
+        self.assertIsNone(post.embedding)
+
+
+class PostListQueryCountTest(APITestCase):
+    def setUp(self):
+        self.authors = [User.objects.create_user(username=f'author{i}', password='password123') for i in range(3)]
+        for i in range(12):
+            post = Post.objects.create(author=self.authors[i % 3], content=f"Post {i}")
+            for author in self.authors[:i % 3 + 1]:
+                Comment.objects.create(post=post, author=author, content="Nice")
+            for author in self.authors:
+                if author != post.author:
+                    Like.objects.create(post=post, user=author)
+        # Rows were written directly, bypassing the endpoints that maintain the counters.
+        call_command('reconcile_post_counters', stdout=StringIO())
+
+    def test_list_uses_constant_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 12)
+        for item in response.data['results']:
+            post = Post.objects.get(id=item['id'])
+            self.assertEqual(item['like_count'], post.likes.count())
+            self.assertEqual(item['comment_count'], post.comments.count())
+            self.assertEqual(item['author_username'], post.author.username)
+
+
+class PostCounterTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='poster', password='password123')
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.post = Post.objects.create(author=self.author, content="Counted post")
+        self.client.force_authenticate(self.reader)
+
+    def test_like_toggle_updates_counter(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_create_and_delete_update_counter(self):
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'content': "First"})
+        self.assertEqual(response.status_code, 201)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        self.client.delete(f"/api/comments/{response.data['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_comment_cannot_move_to_another_post(self):
+        other = Post.objects.create(author=self.author, content="Other post")
+        self.client.force_authenticate(self.author)
+        comment_id = self.client.post('/api/comments/', {'post': self.post.id, 'content': "Stay"}).data['id']
+
+        response = self.client.patch(f'/api/comments/{comment_id}/', {'post': other.id, 'content': "Moved?"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['post'], self.post.id)
+        response = self.client.put(f'/api/comments/{comment_id}/', {'post': other.id, 'content': "Moved!"})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Comment.objects.get(id=comment_id).post_id, self.post.id)
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.post.comment_count, other.comment_count), (1, 0))
+
+    def test_flag_and_edit_do_not_write_counters(self):
+        moderator = User.objects.create_user(username='counter_mod', password='password123', is_moderator=True)
+        self.client.force_authenticate(moderator)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.patch(f'/api/posts/{self.post.id}/flag/').status_code, 200)
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as edit_ctx:
+            self.assertEqual(
+                self.client.patch(f'/api/posts/{self.post.id}/', {'content': "Edited"}).status_code, 200
+            )
+
+        updates = [query['sql'] for query in ctx.captured_queries + edit_ctx.captured_queries
+                   if query['sql'].startswith('UPDATE "forum_post"')]
+        self.assertEqual(len(updates), 2)
+        for sql in updates:
+            self.assertNotIn('like_count', sql)
+            self.assertNotIn('hot_score', sql)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.reader)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+
+        call_command('reconcile_post_counters', stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.comment_count, 0)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='password123')
+        posts = [Post.objects.create(author=self.user, content=f"Post {i}") for i in range(45)]
+        # Force ties on created_at so the id tie-breaker is exercised.
+        Post.objects.filter(id__in=[post.id for post in posts[10:30]]).update(created_at=posts[10].created_at)
+        self.expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_walks_feed_forwards_and_backwards(self):
+        pages = []
+        url = '/api/posts/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([post['id'] for post in response.data['results']])
+            url = response.data['next']
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 5])
+        self.assertEqual([post_id for page in pages for post_id in page], self.expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([post['id'] for post in response.data['results']], pages[-2])
+
+    def test_deep_page_costs_one_query(self):
+        response = self.client.get('/api/posts/?page_size=40')
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_comments_are_paginated_oldest_first(self):
+        post = Post.objects.get(id=self.expected[0])
+        comments = [Comment.objects.create(post=post, author=self.user, content=f"C{i}") for i in range(25)]
+
+        response = self.client.get(f'/api/comments/?post={post.id}')
+        self.assertEqual([c['id'] for c in response.data['results']], [c.id for c in comments[:20]])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['id'] for c in response.data['results']], [c.id for c in comments[20:]])
+        self.assertIsNone(response.data['next'])
+
+    def test_rejects_malformed_cursor(self):
+        response = self.client.get('/api/posts/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryEmbeddingCacheTest(APITestCase):
+    def test_entries_expire_and_evict(self):
+        cache = QueryEmbeddingCache(max_entries=2, ttl=60)
+        embed = MagicMock(side_effect=lambda text: [float(len(text))] * 4)
+
+        cache.get_or_embed('a', 'model', embed)
+        cache.get_or_embed('bb', 'model', embed)
+        cache.get_or_embed('ccc', 'model', embed)  # evicts 'a'
+        cache.get_or_embed('a', 'model', embed)
+        self.assertEqual(embed.call_count, 4)
+
+        with patch('forum.embeddings.time.monotonic', return_value=time.monotonic() + 120):
+            cache.get_or_embed('a', 'model', embed)
+        self.assertEqual(embed.call_count, 5)
+
+    def test_model_is_part_of_the_key(self):
+        cache = QueryEmbeddingCache()
+        embed = MagicMock(return_value=[0.5] * 4)
+        cache.get_or_embed('query', 'model-a', embed)
+        cache.get_or_embed('query', 'model-b', embed)
+        self.assertEqual(embed.call_count, 2)
+
+    def test_shared_backend_serves_other_processes(self):
+        embed = MagicMock(return_value=[0.25] * 4)
+        QueryEmbeddingCache(cache_alias='default').get_or_embed('shared query', 'model', embed)
+
+        other_process = QueryEmbeddingCache(cache_alias='default')
+        vector = other_process.get_or_embed('shared query', 'model', embed)
+
+        self.assertEqual(embed.call_count, 1)
+        self.assertEqual(other_process.stats()['shared_hits'], 1)
+        np.testing.assert_allclose(vector, [0.25] * 4)
+
+    def test_lookups_are_exported_as_metrics(self):
+        cache.clear()
+        metrics.clear()
+        embed = MagicMock(return_value=[0.5] * 4)
+        QueryEmbeddingCache(cache_alias='default').get_or_embed('counted query', 'model', embed)
+        other_process = QueryEmbeddingCache(cache_alias='default')
+        other_process.get_or_embed('counted query', 'model', embed)
+        other_process.get_or_embed('counted query', 'model', embed)
+
+        rendered = metrics.render()
+        for result in ('hit', 'shared_hit', 'miss'):
+            self.assertIn(f'forum_query_embedding_cache_total{{result="{result}"}} 1', rendered)
+
+
+class AnchorPersistenceTest(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.override = override_settings(ANCHOR_VECTORS_DIR=Path(self.tmp.name), EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+        self.override.enable()
+        anchors.ANCHOR_CACHE.clear()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+        self.override.disable()
+        self.tmp.cleanup()
+
+    def test_refresh_writes_file_loaded_at_startup(self):
+        call_command('refresh_anchors', stdout=StringIO())
+
+        anchors.preload()
+
+        provider = get_provider()
+        self.assertEqual(set(anchors.ANCHOR_CACHE[provider.model]), set(anchors.ANCHOR_DESCRIPTIONS))
+        with patch.object(provider, 'embed') as embed:
+            anchors.get_anchor_vectors(provider)
+        self.assertFalse(embed.called, "Preloaded anchors should not be re-embedded.")
+
+    def test_refresh_only_embeds_changed_descriptions(self):
+        call_command('refresh_anchors', stdout=StringIO())
+        changed = dict(anchors.ANCHOR_DESCRIPTIONS, News="Store opening announcements.")
+        provider = get_provider()
+
+        with patch.dict(anchors.ANCHOR_DESCRIPTIONS, changed), patch.object(provider, 'embed', wraps=provider.embed) as embed:
+            self.assertIsNone(anchors.load_anchors(provider.model))
+            vectors = anchors.compute_anchors(provider, previous=anchors.load_previous_vectors())
+
+        embed.assert_called_once_with(["Store opening announcements."])
+        np.testing.assert_allclose(vectors['News'], provider.vector_for("Store opening announcements."), rtol=1e-6)
+
+    def test_missing_file_falls_back_to_one_batched_call(self):
+        client = FakeEmbeddingClient()
+        provider = GeminiProvider(client=client)
+        anchors.get_anchor_vectors(provider)
+        anchors.get_anchor_vectors(provider)
+        self.assertEqual(len(client.calls), 1)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class CategoriserTest(APITestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.anchor_vectors = {name: rng.normal(size=64) for name in ['A', 'B', 'C', 'D']}
+        self.posts = rng.normal(size=(200, 64))
+
+    def test_l2_matches_per_anchor_loop(self):
+        categories, margins = Categoriser(self.anchor_vectors, metric='l2').classify(self.posts)
+
+        for post_vector, category, margin in zip(self.posts, categories, margins):
+            distances = {name: np.linalg.norm(post_vector - anchor) for name, anchor in self.anchor_vectors.items()}
+            ranked = sorted(distances.values())
+            self.assertEqual(category, min(distances, key=distances.get))
+            self.assertAlmostEqual(float(margin), ranked[1] - ranked[0], places=3)
+
+    def test_cosine_ignores_vector_length(self):
+        categoriser = Categoriser(self.anchor_vectors, metric='cosine')
+        short, _ = categoriser.classify(self.posts)
+        long, _ = categoriser.classify(self.posts * 50)
+        self.assertEqual(short, long)
+
+    @override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+    def test_recategorise_command_updates_changed_posts(self):
+        user = User.objects.create_user(username='sorter', password='password123')
+        anchors.ANCHOR_CACHE.clear()
+        try:
+            post = Post.objects.create(
+                author=user, content="Unsorted", category="Wrong",
+                embedding=anchors.get_anchor_vectors()['Hardware'].tolist()
+            )
+            call_command('recategorise_posts', stdout=StringIO())
+        finally:
+            anchors.ANCHOR_CACHE.clear()
+
+        post.refresh_from_db()
+        self.assertEqual(post.category, 'Hardware')
+
+
+@override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+class ReembedPostsTest(APITestCase):
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.tmp.name, 'checkpoint.json')
+        user = User.objects.create_user(username='backfill', password='password123')
+        self.posts = [Post.objects.create(author=user, content=f"Backfill {i}") for i in range(5)]
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+        self.tmp.cleanup()
+
+    def test_backfills_missing_embeddings(self):
+        call_command(
+            'reembed_posts', '--batch-size', '2',
+            '--checkpoint', self.checkpoint, stdout=StringIO()
+        )
+
+        for post in self.posts:
+            post.refresh_from_db()
+            self.assertEqual(len(post.embedding), 3072)
+            self.assertEqual(len(post.embedding_ann), ANN_DIMENSIONS)
+            self.assertIsNotNone(post.category)
+        self.assertFalse(EmbeddingJob.objects.exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_checkpoint_after_failure(self):
+        real_embed_chunks = worker.embed_chunks
+        calls = []
+
+        def flaky_embed_chunks(provider, texts, concurrency):
+            calls.append(texts)
+            if len(calls) == 2:
+                return [texts], [ConnectionError("quota exceeded")]
+            return real_embed_chunks(provider, texts, concurrency)
+
+        args = ['reembed_posts', '--batch-size', '2', '--checkpoint', self.checkpoint]
+        with patch('forum.management.commands.reembed_posts.embed_chunks', side_effect=flaky_embed_chunks):
+            with self.assertRaises(CommandError):
+                call_command(*args, stdout=StringIO())
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['last_id'], self.posts[1].id)
+
+        with patch('forum.management.commands.reembed_posts.embed_chunks', side_effect=flaky_embed_chunks):
+            call_command(*args, stdout=StringIO())
+
+        self.assertEqual(calls[2:], [["Backfill 2", "Backfill 3"], ["Backfill 4"]])
+        self.assertFalse(Post.objects.filter(embedding__isnull=True).exists())
+
+
+class DeferredEmbeddingTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='light', password='password123', is_moderator=True)
+        self.vector = np.random.default_rng(3).normal(size=3072).astype(np.float32)
+        self.post = Post.objects.create(author=self.user, content="Heavy row", embedding=self.vector.tolist())
+
+    def test_feed_does_not_select_embeddings(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/posts/')
+        self.assertNotIn('"forum_post"."embedding', ctx.captured_queries[0]['sql'])
+
+    def test_flag_does_not_load_embedding(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(f'/api/posts/{self.post.id}/flag/', {'is_misleading': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('"embedding' in query['sql'] for query in ctx.captured_queries))
+
+        post = Post.objects.with_embeddings().get(id=self.post.id)
+        self.assertTrue(post.is_misleading)
+        np.testing.assert_allclose(post.embedding, self.vector, rtol=1e-6)
+        self.assertEqual(len(post.embedding_ann), ANN_DIMENSIONS)
+
+    def test_binary_vectors_match_stored_embedding(self):
+        [(post_id, data)] = Post.objects.embedding_vectors()
+        self.assertEqual(post_id, self.post.id)
+        np.testing.assert_array_equal(decode_vector(data), self.vector)
+
+
+class HybridSearchTest(APITestCase):
+    def setUp(self):
+        get_query_cache().clear()
+        reset_provider()
+        self.user = User.objects.create_user(username='hybrid', password='password123')
+        self.fake = FakeEmbeddingClient()
+        contents = [
+            "Replaced the SPR-2041 power supply on the shelf unit",
+            "Heat dissipation problems with LED strips in chilled aisles",
+            "WebSocket reconnect storms after the ConnectOS update",
+            "How do I reset a frozen payment terminal?",
+        ]
+        self.posts = [
+            Post.objects.create(author=self.user, content=text, embedding=self.fake.vector_for(text).tolist())
+            for text in contents
+        ]
+
+    @patch('google.genai.Client')
+    def test_lexical_mode_never_embeds(self, mock_client_class):
+        response = self.client.get('/api/posts/search/', {'q': 'heat LED', 'mode': 'lexical'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.json()], [self.posts[1].id])
+        self.assertFalse(mock_client_class.called)
+
+    @patch('google.genai.Client')
+    def test_hybrid_serves_part_numbers_from_the_index(self, mock_client_class):
+        response = self.client.get('/api/posts/search/', {'q': 'SPR-2041', 'mode': 'hybrid'})
+
+        self.assertEqual([post['id'] for post in response.json()], [self.posts[0].id])
+        self.assertFalse(mock_client_class.called)
+
+    @patch('google.genai.Client')
+    def test_hybrid_fuses_both_rankings(self, mock_client_class):
+        mock_client_class.return_value = self.fake
+        # The words only match post 3, but the query embeds right on top of post 2.
+        self.fake.vector_for = MagicMock(return_value=np.asarray(self.posts[2].embedding))
+
+        response = self.client.get('/api/posts/search/', {'q': 'frozen terminal', 'mode': 'hybrid', 'limit': 4})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual({post['id'] for post in response.json()[:2]}, {self.posts[2].id, self.posts[3].id})
+
+    def test_rrf_rewards_agreement(self):
+        a, b, c = self.posts[:3]
+        fused = reciprocal_rank_fusion([a, b], [c, b], k=60)
+        self.assertEqual(fused[0], b)
+
+    @override_settings(SEARCH_EMBED_TIMEOUT=0.05)
+    @patch('google.genai.Client')
+    def test_slow_embedding_falls_back_to_full_text(self, mock_client_class):
+        async def slow_embed_content(model, contents):
+            await asyncio.sleep(5)
+        mock_client_class.return_value.aio.models.embed_content = slow_embed_content
+
+        started = time.perf_counter()
+        response = self.client.get('/api/posts/search/', {'q': 'payment terminal'})
+
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Search-Fallback'], 'lexical')
+        self.assertEqual([post['id'] for post in response.json()], [self.posts[3].id])
+
+    @patch('google.genai.Client')
+    def test_embedding_error_falls_back_to_full_text(self, mock_client_class):
+        mock_client_class.return_value.aio.models.embed_content = AsyncMock(
+            side_effect=ConnectionError("quota exceeded")
+        )
+        for mode in ('semantic', 'hybrid'):
+            response = self.client.get('/api/posts/search/', {'q': 'payment terminal', 'mode': mode})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Search-Fallback'], 'lexical')
+            self.assertEqual([post['id'] for post in response.json()], [self.posts[3].id])
+
+    def test_validates_mode_and_limit(self):
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'x', 'mode': 'magic'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'x', 'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'x', 'limit': 'all'}).status_code, 400)
+
+
+class HashingProviderTest(APITestCase):
+    def setUp(self):
+        get_query_cache().clear()
+        anchors.ANCHOR_CACHE.clear()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_vectors_are_deterministic_and_unit_length(self):
+        first, second = HashingProvider().embed(["LED strip overheating", "LED strip overheating"])
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(first.shape, (3072,))
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_shared_words_land_closer(self):
+        base, near, far = HashingProvider().embed([
+            "payment terminal frozen at checkout",
+            "frozen payment terminal",
+            "websocket latency in the cloud backend",
+        ])
+        self.assertLess(np.linalg.norm(base - near), np.linalg.norm(base - far))
+
+    def test_large_inputs_are_split_into_batches(self):
+        provider = HashingProvider(dimensions=16)
+        provider.max_batch_size = 3
+        with patch.object(provider, '_embed_batch', wraps=provider._embed_batch) as embed_batch:
+            vectors = provider.embed([f"text {i}" for i in range(7)])
+        self.assertEqual(len(vectors), 7)
+        self.assertEqual([len(call.args[0]) for call in embed_batch.call_args_list], [3, 3, 1])
+
+    def test_signal_stays_in_ann_prefix(self):
+        vector = HashingProvider().vector_for("payment terminal frozen at checkout")
+        self.assertFalse(vector[ANN_DIMENSIONS:].any())
+        np.testing.assert_allclose(reduce_embedding(vector), vector[:ANN_DIMENSIONS], rtol=1e-6)
+
+    @override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+    @patch('google.genai.Client')
+    def test_search_and_worker_run_offline(self, mock_client_class):
+        user = User.objects.create_user(username='offline', password='password123')
+        posts = [
+            Post.objects.create(author=user, content=text)
+            for text in ["frozen payment terminal at checkout", "LED strips overheating on shelves"]
+        ]
+
+        self.assertEqual(worker.drain(), 2)
+        response = self.client.get('/api/posts/search/', {'q': 'payment terminal', 'mode': 'semantic'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['id'], posts[0].id)
+        self.assertFalse(mock_client_class.called)
+
+
+@override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER, RELATED_POSTS_K=2, EMBEDDING_WORKER_IN_PROCESS=False)
+class RelatedPostsTest(TransactionTestCase):
+    """
+    A TransactionTestCase, so every test starts from an empty HNSW graph: rows that
+    TestCase rolls back stay in the index until VACUUM and could change what it returns.
+    """
+    client_class = APIClient
+    TEXTS = [
+        "frozen payment terminal at checkout",
+        "payment terminal frozen again at checkout",
+        "LED strips overheating on shelves",
+        "shelf LED strips overheating",
+        "websocket latency in the cloud backend",
+    ]
+
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+        self.user = User.objects.create_user(username='relater', password='password123')
+        self.posts = [Post.objects.create(author=self.user, content=text) for text in self.TEXTS]
+        worker.drain()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def neighbour_lists(self, field='neighbour_id'):
+        lists = {}
+        for post_id, value in RelatedPost.objects.values_list('post_id', field):
+            lists.setdefault(post_id, []).append(value)
+        return lists
+
+    def test_related_is_one_query_nearest_first(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/posts/{self.posts[0].id}/related/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(response.json()[0]['id'], self.posts[1].id)
+        self.assertEqual(self.client.get(f'/api/posts/{self.posts[-1].id + 100}/related/').status_code, 404)
+
+    def test_new_post_displaces_furthest_neighbour(self):
+        newcomer = Post.objects.create(author=self.user, content="checkout payment terminal frozen")
+        worker.drain()
+        self.assertIn(newcomer.id, self.neighbour_lists()[self.posts[0].id])
+        self.assertTrue(all(len(neighbours) == 2 for neighbours in self.neighbour_lists().values()))
+
+    def test_short_index_results_fall_back_to_exact_scan(self):
+        with patch('forum.related.ann_search', return_value=[]):
+            newcomer = Post.objects.create(author=self.user, content="checkout payment terminal frozen")
+            worker.drain()
+        self.assertEqual(len(self.neighbour_lists()[newcomer.id]), 2)
+
+    def test_rebuild_matches_incremental_lists(self):
+        incremental = self.neighbour_lists()
+        distances = self.neighbour_lists('distance')
+        # In memory, and streamed from the database in small chunks.
+        for options in ({}, {'max_memory_mb': 0, 'chunk_size': 2, 'block_size': 3}):
+            call_command('rebuild_related_posts', stdout=StringIO(), **options)
+            self.assertEqual(self.neighbour_lists(), incremental)
+            for post_id, rebuilt in self.neighbour_lists('distance').items():
+                np.testing.assert_allclose(rebuilt, distances[post_id], rtol=1e-4)
+
+    def test_compute_neighbours_is_exact(self):
+        matrix = np.random.default_rng(0).normal(size=(50, 8)).astype(np.float32)
+        ids = list(range(100, 150))
+        squared = ((matrix[:, None, :] - matrix[None, :, :]) ** 2).sum(axis=2)
+        np.fill_diagonal(squared, np.inf)
+        blocks = [(ids[i:i + 7], matrix[i:i + 7]) for i in range(0, 50, 7)]
+        corpus = lambda: [(ids[i:i + 6], matrix[i:i + 6]) for i in range(0, 50, 6)]
+        for post_id, neighbours in related.compute_neighbours(blocks, corpus, k=3):
+            expected = np.argsort(squared[post_id - 100])[:3] + 100
+            self.assertEqual([neighbour_id for neighbour_id, _ in neighbours], expected.tolist())
+
+
+@override_settings(EXPORT_TOKEN='export-secret', EXPORT_CHUNK_SIZE=2, EXPORT_WATERMARK_LAG=0)
+class ExportTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='exporter', password='password123')
+        self.reader = User.objects.create_user(username='analyst', password='password123')
+        self.old_post = Post.objects.create(author=self.author, content="Before the watermark")
+        self.watermark = timezone.now()
+        self.posts = [Post.objects.create(author=self.author, content=f"New post {i}") for i in range(3)]
+        Comment.objects.create(post=self.posts[0], author=self.reader, content="First!")
+        Like.objects.create(post=self.posts[0], user=self.reader)
+
+    async def fetch(self, **params):
+        response = await self.async_client.get(
+            '/api/export/', params, headers={'Authorization': 'Bearer export-secret'}
+        )
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        return response, [json.loads(line) for line in body.decode().splitlines()]
+
+    async def test_streams_rows_after_watermark(self):
+        response, records = await self.fetch(since=self.watermark.isoformat())
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records if record['type'] == 'post'],
+            [('post', post.id) for post in self.posts],
+        )
+        self.assertEqual([record['type'] for record in records].count('comment'), 1)
+        self.assertEqual([record['type'] for record in records].count('like'), 1)
+
+        # The returned watermark picks up only what was created since.
+        _, later = await self.fetch(since=response['X-Export-Until'])
+        self.assertEqual(later, [])
+
+    def test_wsgi_export_streams_synchronously(self):
+        response = self.client.get(
+            '/api/export/', {'since': self.watermark.isoformat(), 'types': 'posts'},
+            headers={'Authorization': 'Bearer export-secret'},
+        )
+        self.assertFalse(response.is_async)
+        content = iter(response.streaming_content)
+        self.assertEqual(json.loads(next(content))['id'], self.posts[0].id)
+        self.assertEqual([json.loads(line)['id'] for line in content], [post.id for post in self.posts[1:]])
+
+    @override_settings(EXPORT_WATERMARK_LAG=3600)
+    async def test_watermark_trails_the_clock(self):
+        # Rows stamped inside the lag could still have company in flight, so they
+        # wait for a pull whose watermark has moved past them.
+        response, records = await self.fetch(until=timezone.now().isoformat())
+        self.assertEqual(records, [])
+        until = export.parse_watermark(response['X-Export-Until'])
+        self.assertLess(until, self.watermark - timedelta(minutes=59))
+
+        with override_settings(EXPORT_WATERMARK_LAG=0):
+            _, records = await self.fetch(since=response['X-Export-Until'])
+        self.assertEqual(len(records), 6)
+
+    async def test_types_filter_and_errors(self):
+        _, records = await self.fetch(types='likes')
+        self.assertEqual({record['type'] for record in records}, {'like'})
+        response = await self.async_client.get('/api/export/', {'types': 'users'}, headers={'Authorization': 'Bearer export-secret'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/export/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_writes_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'export.ndjson'
+            stderr = StringIO()
+            call_command(
+                'export_ndjson', types='posts', since=self.watermark.isoformat(),
+                output=str(path), stderr=stderr,
+            )
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual([record['id'] for record in records], [post.id for post in self.posts])
+        self.assertIn("Exported 3 records", stderr.getvalue())
+
+
+@override_settings(FEED_CACHE_TTL=0, HOT_SCORE_HALF_LIFE=3600)
+class HotFeedTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='hot_author', password='password123')
+        self.reader = User.objects.create_user(username='hot_reader', password='password123')
+        self.posts = [Post.objects.create(author=self.author, content=f"Hot {i}") for i in range(5)]
+        self.client.force_authenticate(self.reader)
+
+    def heat(self, post):
+        """
+        The post's decayed engagement right now.
+        """
+        score = Post.objects.get(id=post.id).hot_score
+        return 2 ** (score - ranking.half_lives(timezone.now()))
+
+    def test_likes_and_comments_update_score(self):
+        post = self.posts[0]
+        self.client.put(f'/api/posts/{post.id}/like/')
+        self.client.post('/api/comments/', {'post': post.id, 'content': "Hot take"})
+        self.client.post('/api/comments/bulk/', [{'post': post.id, 'content': "Again"}], format='json')
+        self.assertAlmostEqual(self.heat(post), 1.0 + 1.0 + 2.0 + 2.0, places=2)
+
+        self.client.delete(f'/api/posts/{post.id}/like/')
+        self.assertAlmostEqual(self.heat(post), 5.0, places=2)
+        for comment in Comment.objects.filter(post=post):
+            self.client.force_authenticate(comment.author)
+            self.client.delete(f'/api/comments/{comment.id}/')
+        self.assertAlmostEqual(self.heat(post), 1.0, places=3)
+
+    def test_unlike_removes_only_the_decayed_like(self):
+        post = self.posts[0]
+        now = timezone.now()
+        Post.objects.filter(id=post.id).update(
+            created_at=now - timedelta(hours=2),
+            hot_score=ranking.contribution(1.0, now - timedelta(hours=2)),
+        )
+        like = Like.objects.create(post=post, user=self.reader)
+        Like.objects.filter(id=like.id).update(created_at=now - timedelta(hours=1))
+        Post.objects.filter(id=post.id).update(
+            like_count=1, hot_score=ranking.engagement(1.0, now - timedelta(hours=1)),
+        )
+        self.assertAlmostEqual(self.heat(post), 0.25 + 0.5, places=3)
+
+        self.client.delete(f'/api/posts/{post.id}/like/')
+        self.assertAlmostEqual(self.heat(post), 0.25, places=3)
+
+    def test_hot_feed_orders_by_score_and_paginates(self):
+        for post, likes in zip(self.posts, [0, 3, 1, 0, 2]):
+            Post.objects.filter(id=post.id).update(hot_score=1.0 + likes)
+        expected = [self.posts[i].id for i in (1, 4, 2, 3, 0)]
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/posts/', {'sort': 'hot', 'page_size': 2})
+        ids = [post['id'] for post in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids.extend(post['id'] for post in response.data['results'])
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.client.get('/api/posts/', {'sort': 'top'}).status_code, 400)
+
+    def test_older_engagement_counts_for_less(self):
+        now = timezone.now().timestamp()
+        # Three half-lives old with 15 likes (heat 2), five half-lives old with 15 likes
+        # (heat 0.5), and the fresh posts from setUp at heat 1.
+        warm, cold = self.posts[0], self.posts[1]
+        Post.objects.filter(id=warm.id).update(hot_score=float(ranking.score_at(15, 0, now - 3 * 3600)))
+        Post.objects.filter(id=cold.id).update(hot_score=float(ranking.score_at(15, 0, now - 5 * 3600)))
+
+        ids = [post['id'] for post in self.client.get('/api/posts/', {'sort': 'hot'}).data['results']]
+        self.assertEqual(ids[0], warm.id)
+        self.assertEqual(ids[-1], cold.id)
+        self.assertAlmostEqual(self.heat(warm), 2.0, places=3)
+
+
+class SeedForumTest(APITestCase):
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+        cache.clear()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_loads_consistent_data_with_copy(self):
+        out = StringIO()
+        call_command(
+            'seed_forum', users=6, posts=30, comments=2, likes=3, batch_size=12, days=10, stdout=out,
+        )
+        self.assertIn("Seeded 6 users, 30 posts", out.getvalue())
+
+        posts = Post.objects.filter(author__username__startswith='seed_')
+        self.assertEqual(posts.count(), 30)
+        self.assertEqual(Comment.objects.count(), sum(posts.values_list('comment_count', flat=True)))
+        self.assertEqual(Like.objects.count(), sum(posts.values_list('like_count', flat=True)))
+        self.assertFalse(Like.objects.filter(user=F('post__author')).exists())
+        self.assertFalse(posts.filter(embedding_ann__isnull=True).exists())
+        self.assertTrue(set(posts.values_list('category', flat=True)) <= set(anchors.ANCHOR_DESCRIPTIONS))
+
+        # Ids follow created_at, and every row is reachable through the API.
+        ordered = list(posts.order_by('created_at').values_list('id', flat=True))
+        self.assertEqual(ordered, sorted(ordered))
+        response = self.client.get('/api/posts/', {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_skewed_load_without_vectors(self):
+        totals = seeding.load(users=20, posts=200, comments_per_post=1, likes_per_post=4, skew=2.0, vectors='none')
+        self.assertEqual(totals['posts'], 200)
+        self.assertFalse(Post.objects.filter(embedding__isnull=False).exists())
+        # A few authors write most of the posts.
+        per_author = sorted(Post.objects.values('author').annotate(n=Count('id')).values_list('n', flat=True))
+        self.assertGreater(per_author[-1], 200 / 20 * 3)
+        with self.assertRaises(CommandError):
+            call_command('seed_forum', users=1, posts=1, stdout=StringIO())
+
+
+@override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+class HashingProviderRecallTest(TransactionTestCase):
+    """
+    A TransactionTestCase, so the seeded rows are truncated afterwards. Rows rolled
+    back by TestCase stay in the HNSW graph until VACUUM and would crowd out live
+    candidates in later search tests.
+    """
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_ann_recall_matches_exact_search(self):
+        # Many more posts than the ANN candidate pool, so the index has to do the work.
+        benchmarks.seed(users=5, posts=600, comments_per_post=0, likes_per_post=0)
+        provider = get_provider()
+        for query in ["payment terminal frozen", "LED heat dissipation shelf", "websocket latency cloud"]:
+            vector = provider.embed([query])[0]
+            self.assertGreaterEqual(recall_at_k(Post.objects.all(), vector, 10), 0.9, query)
+
+
+class FeedCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='feeder', password='password123', is_moderator=True)
+        self.reader = User.objects.create_user(username='lurker', password='password123')
+        self.post = Post.objects.create(author=self.author, content="Cached post", category="News")
+
+    def test_repeat_reads_skip_the_database(self):
+        first = self.client.get('/api/posts/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/')
+        self.assertEqual(first.data, second.data)
+
+    def test_pages_are_cached_per_category(self):
+        Post.objects.create(author=self.author, content="Other", category="Hardware")
+        self.assertEqual(len(self.client.get('/api/posts/').data['results']), 2)
+        response = self.client.get('/api/posts/', {'category': 'News'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post.id])
+
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get('/api/posts/')
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['like_count'], 1)
+
+        self.client.post('/api/comments/', {'post': self.post.id, 'content': "Hi"})
+        self.assertEqual(self.client.get('/api/posts/').data['results'][0]['comment_count'], 1)
+
+        self.client.force_authenticate(self.author)
+        self.client.patch(f'/api/posts/{self.post.id}/flag/', {'is_misleading': True})
+        self.assertTrue(self.client.get('/api/posts/').data['results'][0]['is_misleading'])
+
+    def test_version_bumps_again_on_commit(self):
+        version = feed_cache.feed_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            feed_cache.invalidate()
+        self.assertEqual(feed_cache.feed_version(), version + 2)
+
+
+@override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+class BenchmarkTest(APITestCase):
+    def setUp(self):
+        anchors.ANCHOR_CACHE.clear()
+        cache.clear()
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_seed_sets_counters_without_reconcile(self):
+        post_ids = benchmarks.seed(users=4, posts=30, comments_per_post=2, likes_per_post=3)
+
+        self.assertEqual(len(post_ids), 30)
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertEqual(Like.objects.count(), 90)
+        out = StringIO()
+        call_command('reconcile_post_counters', '--dry-run', stdout=out)
+        self.assertIn("0 posts have drifted", out.getvalue())
+
+    def test_seed_spaces_posts_and_scores_them(self):
+        post_ids = benchmarks.seed(users=4, posts=10, batch_size=4)
+
+        rows = list(Post.objects.filter(id__in=post_ids).order_by('id').values_list('created_at', 'hot_score'))
+        created = [row[0] for row in rows]
+        self.assertEqual(created[0] - created[-1], timedelta(minutes=9))
+        self.assertEqual(len(set(created)), 10)
+        # Same engagement everywhere, so newer posts are hotter.
+        scores = [row[1] for row in rows]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertAlmostEqual(scores[0], ranking.score_at(3, 3, created[0].timestamp()))
+
+    def test_run_reports_latency_and_queries(self):
+        post_ids = benchmarks.seed(users=4, posts=30)
+
+        results = benchmarks.run(post_ids, iterations=3, warmup=1)
+
+        self.assertEqual(set(results), set(benchmarks.scenarios(post_ids)))
+        self.assertEqual(results['feed']['queries'], 0)
+        self.assertEqual(results['feed_uncached']['queries'], 1)
+        for summary in results.values():
+            self.assertEqual(summary['iterations'], 3)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+        json.dumps(results)
+
+    def test_compare_reports_relative_change(self):
+        baseline = {'feed': {'p50_ms': 2.0, 'p99_ms': 4.0, 'queries': 1}}
+        current = {'feed': {'p50_ms': 3.0, 'p99_ms': 4.0, 'queries': 0}}
+        report = benchmarks.compare(current, baseline)
+        self.assertEqual(report['feed']['p50_ms'], (2.0, 3.0, 0.5))
+        self.assertEqual(report['feed']['queries'], (1, 0, -1))
+
+
+class PerformanceMiddlewareTest(APITestCase):
+    def setUp(self):
+        metrics.clear()
+        get_query_cache().clear()
+        anchors.ANCHOR_CACHE.clear()
+        self.author = User.objects.create_user(username='timed', password='password123')
+        self.reader = User.objects.create_user(username='timer', password='password123')
+        self.post = Post.objects.create(author=self.author, content="Frozen payment terminal at checkout")
+
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_server_timing_reports_sql(self):
+        response = self.client.get('/api/posts/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER)
+    def test_async_search_reports_embedding_time(self):
+        response = self.client.get('/api/posts/search/', {'q': 'payment terminal'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('embed;dur=', response['Server-Timing'])
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    def test_histograms_are_labelled_by_action(self):
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+
+        text = self.client.get('/api/metrics/').content.decode()
+
+        self.assertIn('forum_requests_total{view="post-like",method="POST",status="201"} 1', text)
+        self.assertIn('forum_request_db_queries_count{view="post-like",method="POST"} 1', text)
+        self.assertIn('forum_request_duration_seconds_bucket{view="post-like",method="POST",le="+Inf"} 1', text)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_token_is_enforced(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+
+class LikeEndpointTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='liked', password='password123')
+        self.reader = User.objects.create_user(username='liker', password='password123')
+        self.post = Post.objects.create(author=self.author, content="Likeable")
+        self.url = f'/api/posts/{self.post.id}/like/'
+        self.client.force_authenticate(self.reader)
+
+    def test_put_and_delete_are_idempotent(self):
+        first = self.client.put(self.url)
+        second = self.client.put(self.url)
+        self.assertEqual((first.status_code, first.data['like_count']), (201, 1))
+        self.assertEqual((second.status_code, second.data['like_count']), (200, 1))
+
+        first = self.client.delete(self.url)
+        second = self.client.delete(self.url)
+        self.assertEqual((first.data['liked'], first.data['like_count']), (False, 0))
+        self.assertEqual(second.data['like_count'], 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_like_is_one_statement(self):
+        # One statement changes the like and the counter; a second publishes the new count.
+        with self.assertNumQueries(2):
+            self.client.put(self.url)
+        with self.assertNumQueries(1):
+            self.client.put(self.url)
+        with self.assertNumQueries(2):
+            self.client.delete(self.url)
+
+    def test_rejects_own_post_and_missing_post(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "You cannot like your own post.")
+        self.assertEqual(self.client.put(f'/api/posts/{self.post.id + 1000}/like/').status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+
+@override_settings(AUTH_TOKEN_CACHE_TTL=60)
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.clear()
+        self.author = User.objects.create_user(username='cached_author', password='password123')
+        self.reader = User.objects.create_user(username='cached_reader', password='password123')
+        self.post = Post.objects.create(author=self.author, content="Cached auth")
+        self.token = Token.objects.create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_lookup_skips_token_query(self):
+        url = f'/api/posts/{self.post.id}/like/'
+        with self.assertNumQueries(3):
+            self.client.put(url)
+        # Already liked: one statement, and the token comes from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.put(url)
+        self.assertEqual(response.data['like_count'], 1)
+        rendered = metrics.render()
+        self.assertIn('forum_auth_token_cache_total{result="hit"} 1', rendered)
+        self.assertIn('forum_auth_token_cache_total{result="miss"} 1', rendered)
+
+    def test_deleted_token_is_rejected(self):
+        url = f'/api/posts/{self.post.id}/like/'
+        self.assertEqual(self.client.put(url).status_code, 201)
+        self.token.delete()
+        self.assertEqual(self.client.put(url).status_code, 401)
+
+    def test_moderator_change_is_seen_immediately(self):
+        url = f'/api/posts/{self.post.id}/flag/'
+        self.assertEqual(self.client.patch(url).status_code, 403)
+        self.reader.is_moderator = True
+        self.reader.save()
+        self.assertEqual(self.client.patch(url).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        url = f'/api/posts/{self.post.id}/like/'
+        self.client.put(url)
+        self.reader.is_active = False
+        self.reader.save()
+        self.assertEqual(self.client.put(url).status_code, 401)
+
+
+class ConcurrentLikeTest(TransactionTestCase):
+    def test_parallel_likes_count_once(self):
+        author = User.objects.create_user(username='popular', password='password123')
+        reader = User.objects.create_user(username='clicker', password='password123')
+        post = Post.objects.create(author=author, content="Double-clicked", embedding=[0.0] * 3072)
+        barrier = threading.Barrier(8)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                Like.objects.like(post.id, reader.id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(Like.objects.filter(post=post).count(), 1)
+
+
+class BulkIngestionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def post_batch(self, size):
+        items = [{'content': f"Store report {i}"} for i in range(size)]
+        return self.client.post('/api/posts/bulk/', items, format='json')
+
+    def test_bulk_posts_are_created_and_queued(self):
+        response = self.post_batch(50)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(response.data[0]['author_username'], 'importer')
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(
+            set(EmbeddingJob.objects.values_list('post_id', flat=True)),
+            {item['id'] for item in response.data}
+        )
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post_batch(5)
+        with CaptureQueriesContext(connection) as large:
+            self.post_batch(200)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_bulk_comments_update_counters(self):
+        posts = [Post.objects.create(author=self.user, content=f"Post {i}") for i in range(2)]
+        items = [{'post': posts[0].id, 'content': "a"}, {'post': posts[1].id, 'content': "b"}, {'post': posts[0].id, 'content': "c"}]
+
+        response = self.client.post('/api/comments/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([c['content'] for c in response.data], ["a", "b", "c"])
+        for post, expected in zip(posts, [2, 1]):
+            post.refresh_from_db()
+            self.assertEqual(post.comment_count, expected)
+
+    def test_rejects_bad_batches_without_writing(self):
+        post = Post.objects.create(author=self.user, content="Only post")
+        items = [{'post': post.id, 'content': "ok"}, {'post': post.id + 999, 'content': "orphan"}]
+        response = self.client.post('/api/comments/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(post.id + 999), response.data['error'])
+
+        response = self.client.post('/api/posts/bulk/', [{'content': "fine"}, {}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[1], {'content': ['This field is required.']})
+
+        self.assertEqual(self.client.post('/api/posts/bulk/', {'content': "x"}, format='json').status_code, 400)
+        with override_settings(BULK_CREATE_MAX_ITEMS=3):
+            self.assertEqual(self.post_batch(4).status_code, 400)
+
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Post.objects.count(), 1)
+
+
+@override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER, EMBEDDING_WORKER_IN_PROCESS=False)
+class WorkerConnectionTest(TransactionTestCase):
+    def tearDown(self):
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_process_embeddings_releases_its_connection(self):
+        user = User.objects.create_user(username='batch', password='password123')
+        post = Post.objects.create(author=user, content="Queued for the worker")
+
+        call_command('process_embeddings', '--once', stdout=StringIO())
+
+        self.assertIsNone(connection.connection)
+        post.refresh_from_db()
+        self.assertIsNotNone(post.category)
+        self.assertFalse(EmbeddingJob.objects.exists())
+
+
+@override_settings(EMBEDDING_WORKER_IN_PROCESS=False, EVENTS_CHANNEL='forum_events_test')
+class LiveEventsTest(TransactionTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='streamer', password='password123')
+        self.reader = User.objects.create_user(username='watcher', password='password123', is_moderator=True)
+        self.listener = psycopg.connect(**events.listener_params(), autocommit=True)
+        self.listener.execute('LISTEN forum_events_test')
+
+    def tearDown(self):
+        self.listener.close()
+
+    def received(self):
+        return [json.loads(notify.payload) for notify in self.listener.notifies(timeout=0.5)]
+
+    def test_events_follow_the_transaction(self):
+        with transaction.atomic():
+            events.publish('flagged', {'id': 1, 'is_misleading': True})
+            transaction.set_rollback(True)
+        self.assertEqual(self.received(), [])
+
+    def test_writes_publish_events(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/api/posts/', {'content': "Live post"})
+        post_id = response.data['id']
+        self.client.force_authenticate(self.reader)
+        self.client.put(f'/api/posts/{post_id}/like/')
+        self.client.patch(f'/api/posts/{post_id}/flag/', {'is_misleading': True})
+        with override_settings(EMBEDDING_PROVIDER=LOCAL_PROVIDER):
+            worker.drain()
+
+        messages = self.received()
+        self.assertEqual([m['type'] for m in messages], ['post_created', 'like_count', 'flagged', 'post_categorised'])
+        self.assertEqual(messages[0]['data']['content'], "Live post")
+        self.assertEqual(messages[1]['data'], {'id': post_id, 'like_count': 1})
+        self.assertIn(messages[3]['data']['category'], anchors.ANCHOR_DESCRIPTIONS)
+        anchors.ANCHOR_CACHE.clear()
+
+    def test_stream_relays_notifications(self):
+        def publish_committed():
+            try:
+                events.publish('like_count', {'id': 7, 'like_count': 3})
+            finally:
+                connection.close()
+
+        async def scenario():
+            broadcaster = events.Broadcaster(events.listener_params())
+            queue = await broadcaster.subscribe()
+            stream = events.stream(broadcaster, queue)
+            first = await stream.__anext__()
+            await sync_to_async(publish_committed)()
+            message = await asyncio.wait_for(stream.__anext__(), 5)
+            await stream.aclose()
+            return first, message, broadcaster
+
+        first, message, broadcaster = asyncio.run(scenario())
+
+        self.assertTrue(first.startswith('retry: '))
+        self.assertEqual(message, 'event: like_count\ndata: {"id": 7, "like_count": 3}\n\n')
+        self.assertEqual(broadcaster.queues, set())
+        self.assertIsNone(broadcaster._task)
+
+    def test_wsgi_stream_is_synchronous(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/events/')
+        self.assertFalse(response.is_async)
+        content = iter(response.streaming_content)
+        self.assertTrue(next(content).startswith(b'retry: '))
+
+        events.publish('like_count', {'id': 7, 'like_count': 3})
+        self.assertEqual(next(content), b'event: like_count\ndata: {"id": 7, "like_count": 3}\n\n')
+        response.close()
@@ -1,11 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet
+from .views import PostViewSet, CommentViewSet, event_stream, export_view, metrics_view, search_posts
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
 router.register(r'comments', CommentViewSet)
 
 urlpatterns = [
+    # Async view; listed before the router so it is not taken for a post detail lookup.
+    path('posts/search/', search_posts, name='post-search'),
+    path('events/', event_stream, name='events'),
+    path('export/', export_view, name='export'),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,13 +1,25 @@
-import os
+import asyncio
+import hmac
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
 from rest_framework import viewsets, permissions, status, decorators
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
-from pgvector.django import L2Distance
-from google import genai
 
 from .models import Post, Comment, Like
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import BulkCommentSerializer, PostSerializer, CommentSerializer
+from .search import ann_search, is_exact_query, lexical_search, reciprocal_rank_fusion
+from .embeddings import aembed_query
+from .pagination import HotFeedPagination, PostFeedPagination, CommentPagination
+from . import events, export, feed_cache, metrics, ranking, worker
 
 class CustomAuthToken(ObtainAuthToken):
     """
@@ -25,6 +37,48 @@ class CustomAuthToken(ObtainAuthToken):
             'is_moderator': user.is_moderator
         })
 
+SEARCH_MODES = ('semantic', 'lexical', 'hybrid')
+FEED_SORTS = {'new': PostFeedPagination, 'hot': HotFeedPagination}
+
+def int_query_param(request, name, default, minimum, maximum):
+    """
+    Reads an optional bounded integer query parameter, raising ValueError with a
+    user-facing message if it is malformed or out of range.
+    """
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def served_by_asgi(request):
+    """
+    True under uvicorn. WSGI servers (runserver, mysite.wsgi) read an async
+    StreamingHttpResponse to the end before sending it, so streaming views hand
+    them a sync iterator instead.
+    """
+    return isinstance(request, ASGIRequest)
+
+def bulk_items(request):
+    """
+    Returns the request body as a list of items for a bulk endpoint, or a 400
+    Response if it is not a non-empty array within BULK_CREATE_MAX_ITEMS.
+    """
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty JSON array"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.BULK_CREATE_MAX_ITEMS:
+        return Response(
+            {"error": f"At most {settings.BULK_CREATE_MAX_ITEMS} items per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return items
+
 class PostViewSet(viewsets.ModelViewSet):
     """
     ViewSet for viewing and creating forum posts.
@@ -32,52 +86,64 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = PostFeedPagination
 
     def get_queryset(self):
         """
         Supports optional filtering by category via URL params.
+        Counts are stored on the row and the author is joined, so listing is one query.
         """
-        queryset = Post.objects.all()
+        queryset = Post.objects.select_related('author')
         category = self.request.query_params.get('category')
         if category:
             queryset = queryset.filter(category=category)
         return queryset
 
-    def perform_create(self, serializer):
+    def list(self, request, *args, **kwargs):
         """
-        Automatically set the author to the logged-in user.
+        Feed pages are served through the feed cache and rebuilt only after a write.
+        ?sort=hot orders by Post.hot_score instead of newest first (see forum.ranking).
         """
-        serializer.save(author=self.request.user)
+        sort = request.query_params.get('sort', 'new')
+        if sort not in FEED_SORTS:
+            return Response(
+                {"error": f"sort must be one of {', '.join(FEED_SORTS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        self.pagination_class = FEED_SORTS[sort]
 
-    @decorators.action(detail=False, methods=['get'])
-    def search(self, request):
+        def build():
+            return super(PostViewSet, self).list(request, *args, **kwargs).data
+        return Response(feed_cache.cached_page(request, build))
+
+    def perform_create(self, serializer):
         """
-        AI Semantic Search with optional category filtering.
+        Automatically set the author to the logged-in user. The post and its
+        EmbeddingJob commit together or not at all.
         """
-        query_text = request.query_params.get('q')
-        category = request.query_params.get('category')
-        
-        if not query_text:
-            return Response({"error": "No search query provided"}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            api_key = os.getenv("GOOGLE_API_KEY")
-            client = genai.Client(api_key=api_key)
-            response = client.models.embed_content(model="gemini-embedding-001", contents=query_text)
-            query_vector = response.embeddings[0].values
+        with transaction.atomic():
+            serializer.save(author=self.request.user)
 
-            queryset = Post.objects.exclude(embedding__isnull=True)
-            
-            if category and category != "All":
-                queryset = queryset.filter(category=category)
-
-            results = queryset.order_by(L2Distance('embedding', query_vector))[:2]
-
-            serializer = self.get_serializer(results, many=True)
-            return Response(serializer.data)
+    @decorators.action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Creates many posts from a JSON array in one transaction: one INSERT per
+        BULK_CREATE_BATCH_SIZE rows and one batch of embedding jobs for all of them.
+        """
+        items = bulk_items(request)
+        if isinstance(items, Response):
+            return items
+        serializer = self.get_serializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
 
-        except Exception as e:
-            return Response({"error": f"Search failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        posts = [Post(author=request.user, **item) for item in serializer.validated_data]
+        with transaction.atomic():
+            Post.objects.bulk_create(posts, batch_size=settings.BULK_CREATE_BATCH_SIZE)
+            worker.enqueue(posts)
+            feed_cache.invalidate()
+            data = self.get_serializer(posts, many=True).data
+            events.publish_many('post_created', data)
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @decorators.action(detail=True, methods=['patch'], permission_classes=[permissions.IsAuthenticated])
     def flag(self, request, pk=None):
@@ -92,29 +158,75 @@ class PostViewSet(viewsets.ModelViewSet):
         
         post = self.get_object()
         post.is_misleading = request.data.get('is_misleading', True)
-        post.save()
+        with transaction.atomic():
+            # Only the flag: a full save would overwrite concurrent counter updates.
+            post.save(update_fields=['is_misleading'])
+            events.publish('flagged', {'id': post.id, 'is_misleading': post.is_misleading})
         return Response(self.get_serializer(post).data)
 
-    @decorators.action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @decorators.action(detail=True, methods=['post', 'put', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
         """
-        Handles 'Like' toggle logic. Users cannot like their own posts.
+        PUT likes the post and DELETE removes the like; both are idempotent.
+        POST toggles, for older clients. Each change is one SQL statement that
+        also returns the new like_count. Users cannot like their own posts.
         """
-        post = self.get_object()
-        
-        if post.author == request.user:
+        try:
+            post_id = int(pk)
+        except ValueError:
+            raise NotFound()
+
+        if request.method in ('POST', 'DELETE'):
+            result = Like.objects.unlike(post_id, request.user.id)
+            if result is None:
+                raise NotFound()
+            deleted, like_count = result
+            if deleted:
+                feed_cache.invalidate()
+                events.publish('like_count', {'id': post_id, 'like_count': like_count})
+            # A toggle only goes on to like the post when there was no like to remove.
+            if deleted or request.method == 'DELETE':
+                return Response(
+                    {"detail": "Post unliked.", "liked": False, "like_count": like_count},
+                    status=status.HTTP_200_OK
+                )
+
+        result = Like.objects.like(post_id, request.user.id)
+        if result is None:
+            raise NotFound()
+        author_id, created, like_count = result
+        if author_id == request.user.id:
             return Response(
-                {"error": "You cannot like your own post."}, 
+                {"error": "You cannot like your own post."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        like_exists = Like.objects.filter(user=request.user, post=post).exists()
-        if like_exists:
-            Like.objects.filter(user=request.user, post=post).delete()
-            return Response({"detail": "Post unliked."}, status=status.HTTP_200_OK)
-        
-        Like.objects.create(user=request.user, post=post)
-        return Response({"detail": "Post liked."}, status=status.HTTP_201_CREATED)
+        if created:
+            feed_cache.invalidate()
+            events.publish('like_count', {'id': post_id, 'like_count': like_count})
+        return Response(
+            {"detail": "Post liked.", "liked": True, "like_count": like_count},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @decorators.action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        The post's nearest posts by embedding, nearest first. They are read from the
+        precomputed RelatedPost lists (see forum.related), so this is one indexed lookup.
+        """
+        try:
+            post_id = int(pk)
+        except ValueError:
+            raise NotFound()
+
+        posts = list(
+            Post.objects.select_related('author')
+            .filter(neighbour_of__post_id=post_id)
+            .order_by('neighbour_of__distance', 'id')
+        )
+        if not posts and not Post.objects.filter(id=post_id).exists():
+            raise NotFound()
+        return Response(self.get_serializer(posts, many=True).data)
 
 class CommentViewSet(viewsets.ModelViewSet):
     """
@@ -123,6 +235,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CommentPagination
 
     def get_queryset(self):
         """
@@ -134,4 +247,212 @@ class CommentViewSet(viewsets.ModelViewSet):
         return self.queryset
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            Post.objects.filter(pk=comment.post_id).update(
+                comment_count=F('comment_count') + 1,
+                hot_score=ranking.engagement(settings.HOT_SCORE_COMMENT, comment.created_at),
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            Post.objects.filter(pk=instance.post_id).update(
+                comment_count=F('comment_count') - 1,
+                hot_score=ranking.engagement(-settings.HOT_SCORE_COMMENT, instance.created_at),
+            )
+
+    @decorators.action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Creates many comments from a JSON array of {post, content}. Post ids are
+        checked with one query, and each post's comment_count is raised by one UPDATE.
+        """
+        items = bulk_items(request)
+        if isinstance(items, Response):
+            return items
+        serializer = BulkCommentSerializer(data=items, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        post_ids = {item['post'] for item in serializer.validated_data}
+        missing = post_ids - set(Post.objects.filter(id__in=post_ids).values_list('id', flat=True))
+        if missing:
+            return Response(
+                {"error": f"Unknown post ids: {sorted(missing)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        comments = [
+            Comment(post_id=item['post'], author=request.user, content=item['content'])
+            for item in serializer.validated_data
+        ]
+        added = {}
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments, batch_size=settings.BULK_CREATE_BATCH_SIZE)
+            for comment in comments:
+                added.setdefault(comment.post_id, []).append(comment.created_at)
+            Post.objects.filter(id__in=added).update(
+                comment_count=F('comment_count') + Case(
+                    *[When(id=post_id, then=Value(len(times))) for post_id, times in added.items()],
+                    output_field=IntegerField(),
+                ),
+                hot_score=Case(*[
+                    When(id=post_id, then=ranking.engagement(settings.HOT_SCORE_COMMENT, times))
+                    for post_id, times in added.items()
+                ]),
+            )
+            feed_cache.invalidate()
+        return Response(CommentSerializer(comments, many=True).data, status=status.HTTP_201_CREATED)
+
+def _run_search(queryset, query_text, query_vector, mode, limit, ef_search):
+    """
+    The database half of search_posts: ranks posts and serializes them.
+    query_vector is None for lexical-only searches.
+    """
+    rerank_queryset = queryset.select_related('author')
+    depth = limit * settings.HYBRID_CANDIDATE_MULTIPLIER
+    if query_vector is None:
+        results = lexical_search(rerank_queryset, query_text, limit)
+    elif mode == 'hybrid':
+        lexical = lexical_search(rerank_queryset, query_text, depth)
+        semantic = ann_search(
+            queryset, query_vector, depth, ef_search=ef_search, rerank_queryset=rerank_queryset
+        )
+        results = reciprocal_rank_fusion(lexical, semantic)[:limit]
+    else:
+        results = ann_search(
+            queryset, query_vector, limit=limit, ef_search=ef_search, rerank_queryset=rerank_queryset
+        )
+    return PostSerializer(results, many=True).data
+
+def _exact_lexical_hits(queryset, query_text, limit):
+    """
+    Full-text results for exact-looking queries (part numbers, quoted phrases),
+    which hybrid mode serves without embedding the query.
+    """
+    if not is_exact_query(query_text):
+        return None
+    results = lexical_search(queryset.select_related('author'), query_text, limit)
+    return PostSerializer(results, many=True).data if results else None
+
+@require_GET
+async def search_posts(request):
+    """
+    Search with optional category filtering, served as an async view so the
+    embedding round trip does not hold a worker. ?mode= selects the ranking:
+    - semantic (default): HNSW candidates re-ranked on the full embedding.
+    - lexical: Postgres full-text search only; never calls the embedding API.
+    - hybrid: reciprocal-rank fusion of both.
+    ?limit= sets the result count, ?ef_search= tunes ANN recall against latency.
+
+    If the embedding API fails or does not answer within SEARCH_EMBED_TIMEOUT
+    seconds, the full-text results are returned instead, marked with
+    X-Search-Fallback: lexical.
+    """
+    query_text = request.GET.get('q')
+    category = request.GET.get('category')
+    mode = request.GET.get('mode', 'semantic')
+
+    if not query_text:
+        return JsonResponse({"error": "No search query provided"}, status=400)
+    if mode not in SEARCH_MODES:
+        return JsonResponse({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}, status=400)
+
+    try:
+        limit = int_query_param(request, 'limit', settings.SEARCH_DEFAULT_LIMIT, 1, settings.SEARCH_MAX_LIMIT)
+        ef_search = int_query_param(request, 'ef_search', None, 1, settings.ANN_EF_SEARCH_MAX)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    queryset = Post.objects.all()
+    if category and category != "All":
+        queryset = queryset.filter(category=category)
+
+    try:
+        if mode == 'hybrid':
+            data = await sync_to_async(_exact_lexical_hits)(queryset, query_text, limit)
+            if data is not None:
+                return JsonResponse(data, safe=False)
+
+        query_vector = None
+        fallback = False
+        if mode != 'lexical':
+            try:
+                query_vector = await aembed_query(query_text, timeout=settings.SEARCH_EMBED_TIMEOUT)
+            except asyncio.TimeoutError:
+                fallback = True
+            except Exception as e:
+                # Quota errors, outages and misconfiguration upstream: the
+                # full-text half still answers.
+                print(f"Query embedding failed, serving full-text results: {e}")
+                fallback = True
+
+        data = await sync_to_async(_run_search)(queryset, query_text, query_vector, mode, limit, ef_search)
+        response = JsonResponse(data, safe=False)
+        if fallback:
+            response['X-Search-Fallback'] = 'lexical'
+        return response
+
+    except Exception as e:
+        return JsonResponse({"error": f"Search failed: {str(e)}"}, status=500)
+
+@require_GET
+async def export_view(request):
+    """
+    NDJSON export of posts, comments and likes for analytics, streamed from
+    server-side cursors. ?types= picks tables (default all), ?since= and ?until=
+    bound created_at. The X-Export-Until header is the watermark to pass as
+    ?since= on the next pull. Requires EXPORT_TOKEN as a bearer token.
+    """
+    token = settings.EXPORT_TOKEN
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not token or not hmac.compare_digest(supplied, token):
+        return JsonResponse({"error": "Invalid export token"}, status=403)
+
+    try:
+        types = export.parse_types(request.GET.get('types'))
+        since = request.GET.get('since')
+        since = export.parse_watermark(since) if since else None
+        until = request.GET.get('until')
+        until = export.watermark(export.parse_watermark(until) if until else None)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    content = export.alines(types, since, until) if served_by_asgi(request) else export.lines(types, since, until)
+    response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+    response['X-Export-Until'] = until.isoformat()
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+def metrics_view(request):
+    """
+    Per-view request metrics in the Prometheus text format.
+    When METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, token):
+            return JsonResponse({"error": "Invalid metrics token"}, status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+async def event_stream(request):
+    """
+    Server-Sent Events feed of post_created, post_categorised, like_count and
+    flagged events, so clients can patch their feed instead of polling /posts/.
+    Each event's data is JSON with the post id and the fields that changed.
+    """
+    try:
+        if served_by_asgi(request):
+            broadcaster = events.get_broadcaster()
+            queue = await broadcaster.subscribe()
+            content = events.stream(broadcaster, queue)
+        else:
+            content = events.sync_stream(await sync_to_async(events.listen)())
+    except Exception as e:
+        return JsonResponse({"error": f"Event stream unavailable: {str(e)}"}, status=503)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,182 @@
+"""
+Embedding queue worker.
+
+New posts get an EmbeddingJob row in the same transaction that creates them.
+The worker claims jobs in batches with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of worker processes can drain the queue side by side. Each batch is sent to
+the embedding API as multi-content requests over a bounded thread pool. Failed jobs
+are rescheduled with exponential backoff.
+
+Run it with `python manage.py process_embeddings`. In development the queue is also
+drained by one background thread per process after each commit (see wake()).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import events, related
+from .anchors import get_categoriser
+from .embeddings import get_provider
+from .models import EmbeddingJob, Post
+
+def enqueue(posts):
+    """
+    Queues posts for embedding in the caller's transaction, and wakes this
+    process's drainer after commit when EMBEDDING_WORKER_IN_PROCESS is on.
+    """
+    EmbeddingJob.objects.bulk_create([EmbeddingJob(post=post) for post in posts])
+    if settings.EMBEDDING_WORKER_IN_PROCESS:
+        transaction.on_commit(wake)
+
+def claim_jobs(batch_size):
+    """
+    Locks up to batch_size due jobs and leases them to this worker.
+    The lease moves available_at forward, so if the process dies mid-batch
+    the jobs become claimable again once it expires.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            EmbeddingJob.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now, attempts__lt=settings.EMBEDDING_MAX_ATTEMPTS)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if jobs:
+            EmbeddingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=settings.EMBEDDING_LEASE_SECONDS),
+            )
+    return jobs
+
+def embed_chunks(provider, texts, concurrency):
+    """
+    Splits texts into EMBEDDING_REQUEST_SIZE chunks and embeds them with at most
+    `concurrency` requests in flight. Returns the chunks and, for each one,
+    either its list of vectors or the exception it raised.
+    """
+    size = settings.EMBEDDING_REQUEST_SIZE
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+
+    def run(chunk):
+        try:
+            return provider.embed(chunk)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return chunks, list(pool.map(run, chunks))
+
+def _reschedule(job_ids, error):
+    """
+    Pushes failed jobs back by BACKOFF * 2^(attempts - 1) seconds.
+    """
+    now = timezone.now()
+    for job in EmbeddingJob.objects.filter(id__in=job_ids):
+        delay = settings.EMBEDDING_BACKOFF_SECONDS * 2 ** max(job.attempts - 1, 0)
+        job.available_at = now + timedelta(seconds=delay)
+        job.last_error = str(error)
+        job.save(update_fields=['available_at', 'last_error'])
+
+def process_batch(provider, jobs, concurrency=None):
+    """
+    Embeds and categorises the posts behind the claimed jobs.
+    Returns the number of posts stored successfully.
+    """
+    concurrency = concurrency or settings.EMBEDDING_CONCURRENCY
+    posts = Post.objects.in_bulk([job.post_id for job in jobs])
+    jobs = [job for job in jobs if job.post_id in posts]
+    if not jobs:
+        return 0
+
+    categoriser = get_categoriser(provider)
+    texts = [posts[job.post_id].content for job in jobs]
+    chunks, results = embed_chunks(provider, texts, concurrency)
+
+    stored = 0
+    offset = 0
+    for chunk, result in zip(chunks, results):
+        chunk_jobs = jobs[offset:offset + len(chunk)]
+        offset += len(chunk)
+
+        if isinstance(result, Exception):
+            print(f"Embedding failed for posts {[job.post_id for job in chunk_jobs]}: {result}")
+            _reschedule([job.id for job in chunk_jobs], result)
+            continue
+
+        categories, _ = categoriser.classify(result)
+        with transaction.atomic():
+            for job, post_vector, category in zip(chunk_jobs, result, categories):
+                post = posts[job.post_id]
+                post.embedding = post_vector.tolist()
+                post.category = category
+                post.save(update_fields=['embedding', 'embedding_ann', 'category'])
+                print(f"Success: Embedded and categorized post {post.id} as [{post.category}].")
+            related.update_neighbours({job.post_id: post_vector for job, post_vector in zip(chunk_jobs, result)})
+            EmbeddingJob.objects.filter(id__in=[job.id for job in chunk_jobs]).delete()
+            events.publish_many('post_categorised', [
+                {'id': job.post_id, 'category': category} for job, category in zip(chunk_jobs, categories)
+            ])
+        stored += len(chunk_jobs)
+
+    return stored
+
+def drain(provider=None, batch_size=None, concurrency=None):
+    """
+    Processes due jobs until none are left. Returns the number of posts embedded.
+    """
+    provider = provider or get_provider()
+    if not provider.available:
+        return 0
+
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    total = 0
+    while True:
+        jobs = claim_jobs(batch_size)
+        if not jobs:
+            return total
+        total += process_batch(provider, jobs, concurrency=concurrency)
+
+_wake_lock = threading.Lock()
+_wake_pending = threading.Event()
+_worker_thread = None
+
+def _drain_in_background():
+    global _worker_thread
+    try:
+        while True:
+            with _wake_lock:
+                if not _wake_pending.is_set():
+                    _worker_thread = None
+                    return
+                _wake_pending.clear()
+            # Drop a connection that outlived CONN_MAX_AGE or broke since the last pass.
+            close_old_connections()
+            try:
+                drain()
+            except Exception as e:
+                print(f"Embedding worker failed: {e}")
+    finally:
+        # Hand the connection back (or to the pool) rather than leaking it with the thread.
+        connection.close()
+
+def wake():
+    """
+    Ensures this process has one background thread draining the queue.
+    Called after each commit that enqueues work. Repeated calls while the
+    thread is running only make it do one more pass.
+    """
+    global _worker_thread
+    with _wake_lock:
+        _wake_pending.set()
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(
+                target=_drain_in_background,
+                name="AI_Embedding_worker",
+                daemon=True,
+            )
+            _worker_thread.start()
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -53,7 +54,7 @@ AUTH_USER_MODEL = 'forum.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'forum.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -62,6 +63,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'forum.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,6 +76,29 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'mysite.urls'
 
+# Token auth lookup cache (forum.authentication). Token and user changes evict entries
+# only in the cache they are written to, so with the default per-process LocMemCache
+# other workers would keep accepting revoked tokens for up to the TTL. It is therefore
+# off (TTL 0) unless AUTH_TOKEN_CACHE_ALIAS names a cache shared by all processes,
+# e.g. Redis; AUTH_TOKEN_CACHE_TTL overrides the default either way.
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', 'default')
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60 if os.getenv('AUTH_TOKEN_CACHE_ALIAS') else 0))
+
+# Request instrumentation (forum.middleware / forum.metrics). Server-Timing shows the
+# SQL, embedding and serializer time of each response in the browser's dev tools.
+PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', 'true').lower() == 'true'
+# Bearer token required by GET /api/metrics/; leave unset to serve it openly.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+# NDJSON export (GET /api/export/, manage.py export_ndjson). The endpoint is off
+# unless EXPORT_TOKEN is set; clients send it as a bearer token.
+EXPORT_TOKEN = os.getenv('EXPORT_TOKEN') or None
+EXPORT_CHUNK_SIZE = 2000  # rows per server-side cursor fetch
+# Seconds the end watermark trails the clock, so rows from transactions still in
+# flight when an export starts land in the next pull instead of being skipped.
+# Must exceed the longest write transaction.
+EXPORT_WATERMARK_LAG = int(os.getenv('EXPORT_WATERMARK_LAG', '60'))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -95,6 +120,14 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse. Set DB_POOL=true for a psycopg_pool pool shared by the process;
+# this is the setting for uvicorn, where requests hop between threads. Without the
+# pool, connections close at the end of each request (DB_CONN_MAX_AGE=0), because
+# Django's per-thread persistent connections pile up under ASGI. Under a WSGI server
+# with a fixed thread count, DB_CONN_MAX_AGE=60 reuses them safely. Both modes check
+# a connection is alive before reusing it.
+DB_POOL = os.getenv('DB_POOL', 'false').lower() == 'true'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -103,10 +136,109 @@ DATABASES = {
         'PASSWORD': 'password123',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Django's pool manages connection lifetime itself and requires CONN_MAX_AGE = 0.
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            },
+        } if DB_POOL else {},
     }
 }
 
 
+# Semantic search (pgvector HNSW on Post.embedding_ann)
+# ANN_EF_SEARCH is the default hnsw.ef_search; higher values improve recall at the cost of latency.
+# The search endpoint accepts ?ef_search= to override it per request.
+ANN_EF_SEARCH = int(os.getenv('ANN_EF_SEARCH', 40))
+ANN_EF_SEARCH_MAX = 1000
+# How many ANN candidates to fetch per requested result before exact re-ranking.
+ANN_CANDIDATE_MULTIPLIER = 10
+
+# Length of each post's precomputed related-posts list (GET /api/posts/{id}/related/).
+# 0 stops the worker maintaining the lists.
+RELATED_POSTS_K = 5
+
+# Search endpoint result limits (?limit=) and hybrid (?mode=hybrid) ranking.
+SEARCH_DEFAULT_LIMIT = 2
+SEARCH_MAX_LIMIT = 50
+# Seconds to wait for the query embedding before answering from full-text search alone.
+SEARCH_EMBED_TIMEOUT = float(os.getenv('SEARCH_EMBED_TIMEOUT', 2.0))
+# Reciprocal-rank fusion constant; larger values flatten the advantage of top ranks.
+HYBRID_RRF_K = 60
+# Each ranking contributes limit * this many candidates to the fusion.
+HYBRID_CANDIDATE_MULTIPLIER = 5
+
+# Embedding backends (forum.embeddings). Pick one with the EMBEDDING_PROVIDER environment
+# variable; 'local' is an offline hashing encoder for load tests and benchmarks.
+EMBEDDING_PROVIDERS = {
+    'gemini': {
+        'BACKEND': 'forum.embeddings.GeminiProvider',
+        'OPTIONS': {'model': 'gemini-embedding-001', 'dimensions': 3072},
+    },
+    'local': {
+        'BACKEND': 'forum.embeddings.HashingProvider',
+        'OPTIONS': {'dimensions': 3072},
+    },
+}
+EMBEDDING_PROVIDER = EMBEDDING_PROVIDERS[os.getenv('EMBEDDING_PROVIDER', 'gemini')]
+
+# Search query embeddings are cached in-process (LRU + TTL). Set QUERY_EMBEDDING_CACHE_ALIAS
+# to a configured CACHES alias (e.g. Redis or Memcached) to share them across processes.
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+QUERY_EMBEDDING_CACHE_TTL = 60 * 60
+QUERY_EMBEDDING_CACHE_ALIAS = os.getenv('QUERY_EMBEDDING_CACHE_ALIAS') or None
+
+# Live events (GET /api/events/, Server-Sent Events over Postgres LISTEN/NOTIFY).
+# Streaming needs the ASGI server (uvicorn); runserver would buffer the stream.
+EVENTS_CHANNEL = 'forum_events'
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_RETRY_MS = 3000          # client reconnect delay sent in the stream
+EVENTS_QUEUE_SIZE = 256         # events buffered per client before it is disconnected
+
+# Bulk ingestion endpoints (POST /api/posts/bulk/, /api/comments/bulk/).
+BULK_CREATE_MAX_ITEMS = 1000    # items accepted per request
+BULK_CREATE_BATCH_SIZE = 500    # rows per INSERT statement
+
+# Serialized feed pages (forum.feed_cache). Writes bump a version key in this cache, so
+# with the default per-process cache other processes can serve pages up to
+# FEED_CACHE_TTL seconds stale. Use a cache shared by all processes (e.g. Redis) when
+# running more than one, or set the TTL to what staleness you can accept.
+FEED_CACHE_ALIAS = os.getenv('FEED_CACHE_ALIAS', 'default')
+FEED_CACHE_TTL = 60  # seconds; 0 disables the cache
+
+# Hot feed (GET /api/posts/?sort=hot). A post starts at HOT_SCORE_POST and each like
+# or comment adds its weight, halving every HOT_SCORE_HALF_LIFE seconds after it
+# happened; unlikes and deleted comments take back what is left of theirs. Scores are
+# stored relative to HOT_SCORE_EPOCH (see forum.ranking), so changing the epoch or
+# the half-life means recomputing every post's score.
+HOT_SCORE_POST = 1.0
+HOT_SCORE_LIKE = 1.0
+HOT_SCORE_COMMENT = 2.0
+HOT_SCORE_HALF_LIFE = 12 * 60 * 60
+HOT_SCORE_EPOCH = 1767225600  # 2026-01-01T00:00:00Z, in Unix seconds
+
+# Precomputed category anchor vectors, written by `manage.py refresh_anchors`.
+# Generated per deployment; the default location is git-ignored.
+ANCHOR_VECTORS_DIR = Path(os.getenv('ANCHOR_VECTORS_DIR', BASE_DIR / 'forum' / 'data'))
+# Distance used to pick a post's nearest anchor: 'l2' or 'cosine'.
+CATEGORY_METRIC = 'l2'
+
+# Embedding queue (forum.worker)
+# With EMBEDDING_WORKER_IN_PROCESS each web process drains the queue in one background
+# thread after commits. Turn it off when `manage.py process_embeddings` runs separately.
+EMBEDDING_WORKER_IN_PROCESS = os.getenv('EMBEDDING_WORKER_IN_PROCESS', 'true').lower() == 'true'
+EMBEDDING_BATCH_SIZE = 64       # jobs claimed per worker cycle
+EMBEDDING_REQUEST_SIZE = 16     # texts per embed_content call
+EMBEDDING_CONCURRENCY = 4       # embed_content calls in flight per worker
+EMBEDDING_MAX_ATTEMPTS = 5
+EMBEDDING_BACKOFF_SECONDS = 5   # doubled after each failed attempt
+EMBEDDING_LEASE_SECONDS = 300   # claimed jobs are retried after this if the worker dies
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 